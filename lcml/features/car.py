@@ -0,0 +1,128 @@
+"""Native estimator of feets' CAR(1) features, CAR_sigma, CAR_tau and CAR_mean,
+the parameters of a continuous autoregressive process fit to the LC by
+maximum likelihood.
+
+feets maximizes the Kalman filter likelihood with Nelder-Mead, evaluating one
+parameter pair at a time in a pure Python loop over the LC, typically some
+hundreds of times. Here the likelihood is evaluated for many parameter pairs
+at once, the filter's loop running over arrays of candidates. The search
+starts from a closed-form initialization: for each of a log-spaced grid of
+taus, sigma is set such that the process variance, `tau * sigma ** 2 / 2`,
+matches the LC's variance net of its errors, and is varied around that
+value. The best candidate is refined by successively finer grids in log
+parameter space under a fixed iteration budget, each grid evaluated in a
+single pass of the filter."""
+from typing import Dict
+
+import numpy as np
+
+
+#: Parameter bounds used by feets for both sigma and tau
+_BOUNDS = (1e-6, 100.0)
+
+#: Added to the likelihood of each point as in feets
+_EPSILON = 1e-300
+
+#: Refinement grids span this many steps to either side of the best
+#: candidate, and each grid's step is this many times finer than the last's
+_ZOOM = 3
+
+
+def carLogLikelihoods(sigmas: np.ndarray, taus: np.ndarray, times: np.ndarray,
+                      mags: np.ndarray, errorVars: np.ndarray) -> np.ndarray:
+    """Kalman filter log-likelihoods of the LC under a CAR(1) process for each
+    of several parameter pairs, following feets' formulation.
+
+    :param sigmas: process sigmas
+    :param taus: process taus, same shape as 'sigmas'
+    :param times: LC times
+    :param mags: LC magnitudes
+    :param errorVars: squared LC errors
+    :return: log-likelihood of each parameter pair
+    """
+    deviation = mags - np.mean(mags)
+    decays = np.exp(-np.diff(times)[:, None] / taus[None, :])
+    omega0 = taus * sigmas ** 2 / 2
+    omega = omega0
+    estimate = np.zeros_like(taus)
+    estimates = np.empty((len(mags), len(taus)))
+    omegas = np.empty((len(mags), len(taus)))
+    estimates[0] = estimate
+    omegas[0] = omega
+    for i in range(1, len(mags)):
+        a = decays[i - 1]
+        gain = omega / (omega + errorVars[i - 1])
+        estimate = a * estimate + a * gain * (deviation[i - 1] - estimate)
+        omega = omega0 * (1 - a ** 2) + a ** 2 * omega * (1 - gain)
+        estimates[i] = estimate
+        omegas[i] = omega
+
+    variances = omegas[1:] + errorVars[1:, None]
+    residuals = (estimates[1:] - deviation[1:, None]) ** 2
+    with np.errstate(divide="ignore"):
+        return np.sum(np.log((2 * np.pi * variances) ** -0.5 *
+                             (np.exp(-0.5 * residuals / variances) +
+                              _EPSILON)), axis=0)
+
+
+class CarExtractor:
+    """Estimates feets' CAR features by a batched likelihood search.
+
+    :param gridSize: number of taus of the initialization grid
+    :param maxIterations: bound on the number of refinement grids
+    :param tolerance: refinement stops when the grid step in log parameter
+    space falls below this
+    """
+    name = "car"
+    features = ["CAR_mean", "CAR_sigma", "CAR_tau"]
+
+    def __init__(self, gridSize: int=32, maxIterations: int=10,
+                 tolerance: float=1e-3):
+        self.gridSize = gridSize
+        self.maxIterations = maxIterations
+        self.tolerance = tolerance
+
+    def extract(self, times: np.ndarray, mags: np.ndarray,
+                errors: np.ndarray) -> Dict[str, float]:
+        errorVars = errors ** 2
+        sigma, tau = self._fit(times, mags, errorVars)
+        return {"CAR_sigma": sigma, "CAR_tau": tau,
+                "CAR_mean": np.mean(mags) / tau}
+
+    def _fit(self, times, mags, errorVars) -> (float, float):
+        low, high = np.log(_BOUNDS)
+
+        def logLikelihoods(logParams: np.ndarray) -> np.ndarray:
+            sigmas, taus = np.exp(np.clip(logParams, low, high)).T
+            return carLogLikelihoods(sigmas, taus, times, mags, errorVars)
+
+        # closed-form initialization: process variance matching net variance
+        variance = max(np.var(mags) - np.mean(errorVars),
+                       np.var(mags) * 1e-3, _EPSILON)
+        logTaus = np.linspace(np.log(1e-2), high, self.gridSize)
+        candidates = np.array([(0.5 * (np.log(2 * variance) - t) + s, t)
+                               for t in logTaus
+                               for s in np.linspace(-1, 1, 5)])
+        values = logLikelihoods(candidates)
+        if not np.any(np.isfinite(values)):
+            return np.nan, np.nan
+
+        best = np.clip(candidates[np.nanargmax(values)], low, high)
+
+        # zoom in on the best candidate, a grid of steps at a time
+        step = logTaus[1] - logTaus[0]
+        offsets = np.arange(-_ZOOM, _ZOOM + 1, dtype=np.float64)
+        stencil = np.array([(i, j) for i in offsets for j in offsets])
+        for _ in range(self.maxIterations):
+            if step < self.tolerance:
+                break
+
+            candidates = np.clip(best + step * stencil, low, high)
+            values = logLikelihoods(candidates)
+            if np.any(np.isfinite(values)):
+                best = candidates[np.nanargmax(values)]
+
+            step /= _ZOOM
+
+        sigma, tau = np.exp(best)
+        return sigma, tau
@@ -0,0 +1,163 @@
+"""Native implementations of feets' autocorrelation and structure function
+features. feets computes the slotted autocorrelation from all pairs of points,
+quadratic in LC length, and the autocorrelation function repeatedly over a
+growing number of lags. Here both are computed once with FFTs."""
+from typing import Dict
+
+import numpy as np
+
+
+#: Autocorrelation threshold defining the autocorrelation length features
+_THRESHOLD = np.exp(-1)
+
+
+def _correlation(x: np.ndarray) -> np.ndarray:
+    """Unnormalized autocorrelation `sum(x[i] * x[i + lag])` for every lag
+    from 0 to `len(x) - 1`, computed with a zero-padded FFT"""
+    size = 1 << (2 * len(x) - 1).bit_length()
+    f = np.fft.rfft(x, size)
+    return np.fft.irfft(f.real ** 2 + f.imag ** 2, size)[:len(x)]
+
+
+def _firstBelow(values: np.ndarray, start: int=0):
+    """Index of the first value below the threshold or None"""
+    below = np.flatnonzero(values[start:] < _THRESHOLD)
+    return below[0] + start if len(below) else None
+
+
+class AutocorLengthExtractor:
+    """Computes feets' Autocor_length, the first lag at which the
+    autocorrelation function falls below 1/e. The full autocorrelation
+    function is computed with one FFT rather than for increasing numbers of
+    lags. If it never falls below 1/e the value is NaN."""
+    name = "autocorLength"
+    features = ["Autocor_length"]
+
+    def extract(self, times: np.ndarray, mags: np.ndarray,
+                errors: np.ndarray=None) -> Dict[str, float]:
+        autocovariance = _correlation(mags - np.mean(mags))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            k = _firstBelow(autocovariance / autocovariance[0])
+
+        return {"Autocor_length": np.nan if k is None else k}
+
+
+class SlottedAutocorrelationExtractor:
+    """Computes feets' SlottedA_length, the first time lag, in slots of width
+    'T', at which the slotted autocorrelation falls below 1/e.
+
+    Rather than binning every pair of points by its time difference, the
+    mean-subtracted magnitudes and the point counts are binned on a time grid
+    'oversampling' times finer than the slots. FFT autocorrelations of the
+    two grids give the sums of products and the pair counts for every grid
+    lag, which are then aggregated into slots. Time differences are thereby
+    resolved to within a grid step.
+
+    :param T: slot width; if None, as in feets, the 5th percentile of the time
+    differences between consecutive points
+    :param oversampling: grid steps per slot
+    :param maxGridSize: bound on the grid size; longer LCs use a coarser grid
+    """
+    name = "slottedA"
+    features = ["SlottedA_length"]
+
+    #: Initial number of slots searched, doubled like in feets
+    SLOTS = 100
+
+    def __init__(self, T: float=1, oversampling: int=32,
+                 maxGridSize: int=1 << 22):
+        self.T = T
+        self.oversampling = oversampling
+        self.maxGridSize = maxGridSize
+
+    def extract(self, times: np.ndarray, mags: np.ndarray,
+                errors: np.ndarray=None) -> Dict[str, float]:
+        slotWidth = self.T
+        if slotWidth is None:
+            slotWidth = np.sort(np.diff(times))[int(len(times) * 0.05) + 1]
+
+        t = times - np.min(times)
+        span = np.max(t)
+
+        # feets doubles the slots searched while they remain within the span
+        slotCount = self.SLOTS
+        while 2 * slotCount <= span / slotWidth:
+            slotCount *= 2
+
+        step = max(slotWidth / self.oversampling, span / self.maxGridSize)
+        grid = np.floor(t / step + 0.5).astype(np.int64)
+        deviation = mags - np.mean(mags)
+        sums = _correlation(np.bincount(grid, weights=deviation))
+        counts = np.rint(_correlation(np.bincount(grid).astype(np.float64)))
+
+        # pairs within a grid step are counted in both orders and lag 0 also
+        # holds each point with itself, which feets includes in slot 0
+        sums[0] = (sums[0] + np.sum(deviation ** 2)) / 2
+        counts[0] = (counts[0] + len(t)) / 2
+
+        slots = np.floor(np.arange(len(sums)) * step / slotWidth +
+                         0.5).astype(np.int64)
+        inRange = slots < slotCount
+        slotSums = np.bincount(slots[inRange], weights=sums[inRange],
+                               minlength=slotCount)
+        slotCounts = np.bincount(slots[inRange], weights=counts[inRange],
+                                 minlength=slotCount)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            autocorrelation = (slotSums / slotCounts) / (slotSums[0] /
+                                                         slotCounts[0])
+
+        # slots without pairs are skipped
+        autocorrelation[slotCounts == 0] = np.inf
+        k = _firstBelow(autocorrelation, start=1)
+        return {"SlottedA_length": np.nan if k is None else k * slotWidth}
+
+
+class StructureFunctionExtractor:
+    """Computes feets' StructureFunction_index features, the slopes between
+    the log structure functions of orders 1, 2 and 3. As in feets, the LC is
+    linearly interpolated onto a regular grid of 'POINTS' points. The
+    structure functions of all lags are computed at once from the grid's
+    pairwise differences rather than one lag and order at a time."""
+    name = "structureFunction"
+    features = ["StructureFunction_index_21", "StructureFunction_index_31",
+                "StructureFunction_index_32"]
+
+    #: Points of the interpolation grid
+    POINTS = 100
+
+    #: Structure functions have lags 1 to `LAGS - 1` grid steps
+    LAGS = 100
+
+    def extract(self, times: np.ndarray, mags: np.ndarray,
+                errors: np.ndarray=None) -> Dict[str, float]:
+        order = np.argsort(times, kind="mergesort")
+        grid = np.linspace(np.min(times), np.max(times), self.POINTS)
+        interpolated = np.interp(grid, times[order], mags[order])
+
+        # pairwise differences of points `lag` grid steps apart
+        i, j = np.triu_indices(self.POINTS, 1)
+        lag = j - i
+        inRange = lag < self.LAGS
+        lag = lag[inRange]
+        differences = np.abs(interpolated[j[inRange]] -
+                             interpolated[i[inRange]])
+        pairs = np.bincount(lag, minlength=self.LAGS)[1:]
+        logs = list()
+        for power in (1, 2, 3):
+            # as in feets, the last element is unset and zeros are trimmed
+            sf = np.zeros(self.LAGS)
+            sf[:-1] = np.bincount(lag, weights=differences ** power,
+                                  minlength=self.LAGS)[1:] / pairs
+            with np.errstate(divide="ignore"):
+                logs.append(np.log10(np.trim_zeros(sf)))
+
+        features = dict()
+        for name, (x, y) in (("StructureFunction_index_21", (0, 1)),
+                             ("StructureFunction_index_31", (0, 2)),
+                             ("StructureFunction_index_32", (1, 2))):
+            if len(logs[x]) and len(logs[y]):
+                features[name] = np.polyfit(logs[x], logs[y], 1)[0]
+            else:
+                features[name] = np.nan
+
+        return features
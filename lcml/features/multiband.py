@@ -0,0 +1,133 @@
+"""Feature space of objects observed in two bands, e.g., MACHO's R and B bands,
+each stored as its own LC. The single-band features of each band are combined
+with the paired features comparing the bands (`Color`, `Eta_color`,
+`Q31_color`, `StetsonJ`, `StetsonL`) into one vector per object.
+
+The paired features require the bands' observations aligned in time. Rather
+than aligned by feets per paired extractor, the bands are aligned once per
+object by a sorted merge of their times and the aligned arrays are shared by
+all paired extractors."""
+from typing import List
+
+from feets import FeatureSpace
+from feets.extractors import registered_extractors
+import numpy as np
+
+from lcml.features.native import featureSpace
+
+
+#: feets input data types of the paired features beyond those of a single band
+PAIRED_INPUT_DATA_TYPES = ["magnitude2", "aligned_time", "aligned_magnitude",
+                           "aligned_magnitude2", "aligned_error",
+                           "aligned_error2"]
+
+
+def pairedFeatures() -> List[str]:
+    """Names of the feets features requiring the data of a second band"""
+    return sorted(f for f, e in registered_extractors().items()
+                  if e.get_data().intersection(PAIRED_INPUT_DATA_TYPES))
+
+
+def alignBands(time: np.ndarray, time2: np.ndarray, magnitude: np.ndarray,
+               magnitude2: np.ndarray, error: np.ndarray,
+               error2: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray,
+                                       np.ndarray, np.ndarray):
+    """Synchronizes the observations of two bands, keeping those at times
+    present in both, like `feets.preprocess.align`. Times of each band are
+    merged in sorted order with a binary search rather than a table join.
+    Times within a band are assumed unique, as they are in clean LCs.
+
+    :return: aligned time, magnitude, magnitude2, error, error2
+    """
+    order = np.argsort(time, kind="mergesort")
+    order2 = np.argsort(time2, kind="mergesort")
+    sortedTime = time[order]
+    sortedTime2 = time2[order2]
+    index = np.searchsorted(sortedTime2, sortedTime)
+    matched = index < len(sortedTime2)
+    matched[matched] = sortedTime2[index[matched]] == sortedTime[matched]
+    first = order[matched]
+    second = order2[index[matched]]
+    return (time[first], magnitude[first], magnitude2[second], error[first],
+            error2[second])
+
+
+class MultiBandFeatureSpace:
+    """Stand-in for `feets.FeatureSpace` extracting combined vectors of
+    objects observed in two bands. Vectors hold the first band's features,
+    then the second band's features suffixed by '_<band>', then the paired
+    features.
+
+    :param data: feets input data types of a single band
+    :param bands: names of the two bands
+    :param exclude: features to exclude from either band and the paired ones
+    :param nativeExtractors: native extractor params by extractor name, see
+    `lcml.features.native`
+    """
+    def __init__(self, data: List[str], bands: List[str],
+                 exclude: List[str]=None, nativeExtractors: dict=None):
+        if len(bands) != 2:
+            raise ValueError("Exactly two bands required, got: %s" % bands)
+
+        self.bands = list(bands)
+        self._bandSpace = featureSpace(data, exclude=exclude,
+                                       nativeExtractors=nativeExtractors)
+        paired = sorted(set(pairedFeatures()).difference(exclude or ()))
+        self._pairedSpace = None
+        if paired:
+            self._pairedSpace = FeatureSpace(data=data +
+                                             PAIRED_INPUT_DATA_TYPES,
+                                             only=paired)
+
+        bandFeatures = list(self._bandSpace.features_as_array_)
+        self._features_as_array = np.array(
+            bandFeatures + ["%s_%s" % (f, self.bands[1])
+                            for f in bandFeatures] + paired)
+
+    @property
+    def features_as_array_(self) -> np.ndarray:
+        return self._features_as_array
+
+    def extract(self, lcs: List[tuple],
+                lcStats: List[tuple]=None) -> (np.ndarray, np.ndarray):
+        """Extracts the combined vector of an object
+
+        :param lcs: (times, mags, errors) of each band
+        :param lcStats: optional standardization statistics of each band's LC,
+        (mag mean, mag scale, error mean, error scale) or None, see
+        `lcml.pipeline.stage.preprocess.cleanLc`. Paired features compare
+        the bands in original units.
+        :return: feature names and values
+        """
+        values = [self._bandSpace.extract(*lc)[1] for lc in lcs]
+        if self._pairedSpace is not None:
+            (time, magnitude, error), (time2, magnitude2, error2) = [
+                _originalUnits(lc, stats)
+                for lc, stats in zip(lcs, lcStats or (None, None))]
+            aligned = alignBands(time, time2, magnitude, magnitude2, error,
+                                 error2)
+            values.append(self._pairedSpace.extract(
+                time=time, magnitude=magnitude, error=error,
+                magnitude2=magnitude2, **dict(zip(
+                    ["aligned_time", "aligned_magnitude",
+                     "aligned_magnitude2", "aligned_error",
+                     "aligned_error2"], aligned)))[1])
+
+        return self._features_as_array, np.concatenate(values)
+
+
+def _originalUnits(lc: tuple, stats: tuple) -> tuple:
+    """Inverts the standardization of a LC's mags and errors, if any"""
+    times, mags, errors = lc
+    if stats is None:
+        return times, mags, errors
+
+    magMean, magScale, errMean, errScale = stats
+    return times, mags * magScale + magMean, errors * errScale + errMean
+
+
+def objectBand(uid: str, separator: str) -> (str, str):
+    """Splits a LC uid of the form '<object id><separator><band>'"""
+    objectId, _, band = uid.rpartition(separator)
+    return objectId, band
+
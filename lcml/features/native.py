@@ -0,0 +1,214 @@
+"""Feature space combining lcml's native feature extractors with feets. Native
+extractors compute groups of feets' features faster, e.g., by sharing
+intermediate results, and are enabled by the extract stage's
+'nativeExtractors' param, mapping extractor name to its params:
+
+    "nativeExtractors": {"periodogram": {"samplesPerPeak": 5}}
+
+Features of enabled native extractors are dropped from the feets space; the
+remaining features are extracted by feets. Feature vectors keep feets' layout,
+i.e., values ordered by feature name.
+
+Batched native extractors, marked by a true 'batched' attribute, additionally
+compute features for a whole page of packed LCs at once with
+`extractPacked`. Their per-page results are passed to `extract` of each LC as
+precomputed values.
+
+`extractBudgeted` extracts under a per-LC time budget, running extractors in
+increasing order of predicted cost and skipping those predicted to exceed the
+budget's remainder. Predictions are learned from the extractors' observed
+costs per LC point."""
+import time as _time
+from typing import Dict, List
+
+from feets import FeatureSpace
+import numpy as np
+
+from lcml.features.car import CarExtractor
+from lcml.features.correlation import (AutocorLengthExtractor,
+                                      SlottedAutocorrelationExtractor,
+                                      StructureFunctionExtractor)
+from lcml.features.periodogram import PeriodogramExtractor
+from lcml.features.statistics import StatisticsExtractor
+
+
+#: Native extractor classes by name
+NATIVE_EXTRACTORS = {c.name: c for c in (AutocorLengthExtractor, CarExtractor,
+                                         PeriodogramExtractor,
+                                         SlottedAutocorrelationExtractor,
+                                         StatisticsExtractor,
+                                         StructureFunctionExtractor)}
+
+
+class NativeFeatureSpace:
+    """Stand-in for `feets.FeatureSpace` computing the features of the
+    specified native extractors natively and all other features with feets.
+
+    :param data: feets input data types
+    :param nativeExtractors: native extractor params by extractor name
+    :param exclude: features to exclude
+    :param only: if given, extract only these features
+    """
+    def __init__(self, data: List[str], nativeExtractors: Dict[str, dict],
+                 exclude: List[str]=None, only: List[str]=None):
+        excluded = set(exclude or ())
+        replaced = set()
+        self._extractors = list()
+        for name, params in sorted(nativeExtractors.items()):
+            cls = NATIVE_EXTRACTORS.get(name)
+            if cls is None:
+                raise ValueError("Unsupported native extractor: %s" % name)
+
+            replaced.update(cls.features)
+            features = set(cls.features) - excluded
+            if only:
+                features.intersection_update(only)
+            if features:
+                self._extractors.append((cls(**(params or {})), features))
+
+        nativeFeatures = set().union(*[f for _, f in self._extractors])
+        feetsOnly = sorted(set(only) - replaced) if only else None
+        if feetsOnly is not None and not feetsOnly:
+            self._feetsSpace = None
+            feetsFeatures = set()
+        else:
+            self._feetsSpace = FeatureSpace(data=data, only=feetsOnly,
+                                            exclude=sorted(excluded |
+                                                           replaced))
+            feetsFeatures = set(self._feetsSpace.features_as_array_)
+
+        self._features_as_array = np.array(sorted(feetsFeatures |
+                                                  nativeFeatures))
+
+        #: Observed seconds per LC point of each extractor by name
+        self._costRates = dict()
+
+    @property
+    def features_as_array_(self) -> np.ndarray:
+        return self._features_as_array
+
+    @property
+    def batched(self) -> bool:
+        """Whether any extractor computes features for pages of LCs"""
+        return any(getattr(e, "batched", False) for e, _ in self._extractors)
+
+    def extractPacked(self, times: np.ndarray, mags: np.ndarray,
+                      errors: np.ndarray,
+                      offsets: np.ndarray) -> List[Dict[str, float]]:
+        """Runs the batched extractors on a page of packed LCs
+
+        :return: for each LC, values by feature name to be passed to
+        `extract` as 'precomputed'
+        """
+        precomputed = [dict() for _ in range(len(offsets) - 1)]
+        for extractor, features in self._extractors:
+            if getattr(extractor, "batched", False):
+                result = extractor.extractPacked(times, mags, errors, offsets)
+                for f in features:
+                    for values, v in zip(precomputed, result[f]):
+                        values[f] = v
+
+        return precomputed
+
+    def extract(self, time: np.ndarray, magnitude: np.ndarray,
+                error: np.ndarray=None,
+                precomputed: Dict[str, float]=None) -> (np.ndarray,
+                                                        np.ndarray):
+        """Same contract as `feets.FeatureSpace.extract`
+
+        :param precomputed: values by feature name from `extractPacked`,
+        whose extractors are not run again
+        :return: feature names and corresponding values
+        """
+        time = np.asarray(time)
+        magnitude = np.asarray(magnitude)
+        values = dict(precomputed or ())
+        if self._feetsSpace is not None:
+            values.update(zip(*self._feetsSpace.extract(time, magnitude,
+                                                        error)))
+
+        for extractor, features in self._extractors:
+            if features.difference(values):
+                result = extractor.extract(time, magnitude, error)
+                values.update((f, result[f]) for f in features)
+
+        return self._features_as_array, np.array(
+            [values[f] for f in self._features_as_array])
+
+    def extractBudgeted(self, time: np.ndarray, magnitude: np.ndarray,
+                        error: np.ndarray, budget: float,
+                        precomputed: Dict[str, float]=None) -> (
+            np.ndarray, np.ndarray, np.ndarray):
+        """Like `extract` but within a time budget. Extractors run cheapest
+        first by predicted cost; one is skipped if its predicted cost exceeds
+        the remaining budget or a feature it depends on was skipped. An
+        extractor is not interrupted, so the budget may be exceeded by at
+        most the misprediction of one extractor's cost.
+
+        :param budget: seconds allowed for the LC
+        :return: feature names, corresponding values with NaN for skipped
+        features, and the mask, true for the skipped features
+        """
+        start = _time.perf_counter()
+        time = np.asarray(time)
+        magnitude = np.asarray(magnitude)
+        n = max(len(time), 1)
+        values = dict(precomputed or ())
+        skipped = set()
+        units = [u for u in self._units(time, magnitude, error)
+                 if u[1].difference(values)]
+        units.sort(key=lambda u: self._costRates.get(u[0], 0.0))
+        for name, features, dependencies, run in units:
+            remaining = budget - (_time.perf_counter() - start)
+            if (self._costRates.get(name, 0.0) * n > remaining or
+                    dependencies.difference(values)):
+                skipped.update(features)
+                continue
+
+            unitStart = _time.perf_counter()
+            result = run(values)
+            rate = (_time.perf_counter() - unitStart) / n
+            previous = self._costRates.get(name)
+            self._costRates[name] = (rate if previous is None else
+                                     0.8 * previous + 0.2 * rate)
+            values.update((f, result[f]) for f in features)
+
+        mask = np.array([f in skipped for f in self._features_as_array])
+        return self._features_as_array, np.array(
+            [np.nan if m else values[f]
+             for f, m in zip(self._features_as_array, mask)]), mask
+
+    def _units(self, time, magnitude, error) -> List[tuple]:
+        """Independently runnable extraction steps as tuples of name,
+        features, dependencies and a function of the values computed so far
+        returning values by feature name"""
+        units = list()
+        if self._feetsSpace is not None:
+            kwargs = self._feetsSpace.dict_data_as_array(
+                {"time": time, "magnitude": magnitude, "error": error})
+            selected = self._feetsSpace.features_
+            for e in self._feetsSpace.excecution_plan_:
+                units.append((e.name, set(e.get_features()) & selected,
+                              set(e.get_dependencies()),
+                              lambda v, e=e: e.extract(features=v,
+                                                       **kwargs)))
+
+        for extractor, features in self._extractors:
+            units.append((extractor.name, features, set(),
+                          lambda v, e=extractor: e.extract(time, magnitude,
+                                                           error)))
+
+        return units
+
+
+def featureSpace(data: List[str], exclude: List[str]=None,
+                 only: List[str]=None, nativeExtractors: dict=None,
+                 budgeted: bool=False):
+    """A `feets.FeatureSpace`, or if any native extractors are specified or
+    budgeted extraction is required a `NativeFeatureSpace`"""
+    if nativeExtractors or budgeted:
+        nativeExtractors = nativeExtractors or dict()
+        return NativeFeatureSpace(data, nativeExtractors, exclude=exclude,
+                                  only=only)
+
+    return FeatureSpace(data=data, exclude=exclude, only=only)
@@ -0,0 +1,190 @@
+"""Native implementation of the feets features derived from Lomb-Scargle period
+searches, i.e., those of feets' `LombScargle` extractor (PeriodLS, Period_fit,
+Psi_CS, Psi_eta) and of its `FourierComponents` extractor (Freq1-3 harmonics
+amplitudes and relative phases).
+
+feets computes four periodograms of each LC for these and fits twelve harmonic
+models by nonlinear least squares. Here the frequency grid is built once per
+LC, the periodogram of the LC is shared by both feature groups, the
+periodograms of the prewhitened LC reuse the grid, and the harmonic models,
+being linear in their coefficients, are fit by linear least squares.
+
+Periodogram cost is proportional to the size of the frequency grid. Besides
+the grid's resolution and extent, the 'coarseFactor' param trades accuracy
+for speed: the periodogram is evaluated on a grid that many times coarser and
+the highest of its peaks are then refined on the full resolution grid."""
+from typing import Dict, List
+
+try:
+    from astropy.timeseries import LombScargle
+except ImportError:
+    # astropy < 3.2
+    from astropy.stats import LombScargle
+from feets.libs import ls_fap
+import numpy as np
+
+
+#: Number of frequency components found by successive prewhitening
+FREQUENCY_COMPONENTS = 3
+
+#: Number of harmonics fit for each frequency component
+HARMONICS = 4
+
+#: Features of feets' `LombScargle` extractor
+LOMB_SCARGLE_FEATURES = ["PeriodLS", "Period_fit", "Psi_CS", "Psi_eta"]
+
+#: Features of feets' `FourierComponents` extractor
+HARMONICS_FEATURES = (
+    ["Freq%s_harmonics_amplitude_%s" % (i + 1, j)
+     for i in range(FREQUENCY_COMPONENTS) for j in range(HARMONICS)] +
+    ["Freq%s_harmonics_rel_phase_%s" % (i + 1, j)
+     for i in range(FREQUENCY_COMPONENTS) for j in range(HARMONICS)])
+
+
+class PeriodogramExtractor:
+    """Computes all periodogram-dependent features of a LC from a single
+    frequency grid. Defaults reproduce the grid and normalization used by
+    feets.
+
+    :param samplesPerPeak: grid points across each periodogram peak
+    :param nyquistFactor: multiple of the average Nyquist frequency bounding
+    the grid when 'maximumFrequency' is not given
+    :param minimumFrequency: optional lower bound of the grid
+    :param maximumFrequency: optional upper bound of the grid
+    :param method: astropy `LombScargle.power` method; 'fast' is the
+    O(N log N) method of Press & Rybicki
+    :param normalization: periodogram normalization
+    :param fapMethod: method computing Period_fit, the false alarm
+    probability of the highest peak
+    :param coarseFactor: if greater than 1, peaks are searched for on a grid
+    this many times coarser and refined on the full grid
+    :param candidatePeaks: number of highest points of the coarse grid
+    refined
+    """
+    name = "periodogram"
+    features = LOMB_SCARGLE_FEATURES + HARMONICS_FEATURES
+
+    def __init__(self, samplesPerPeak: float=5, nyquistFactor: float=100,
+                 minimumFrequency: float=None, maximumFrequency: float=None,
+                 method: str="fast", normalization: str="standard",
+                 fapMethod: str="simple", coarseFactor: int=1,
+                 candidatePeaks: int=5):
+        self.gridParams = {"samples_per_peak": samplesPerPeak,
+                           "nyquist_factor": nyquistFactor,
+                           "minimum_frequency": minimumFrequency,
+                           "maximum_frequency": maximumFrequency}
+        self.method = method
+        self.normalization = normalization
+        self.fapMethod = fapMethod
+        self.coarseFactor = max(int(coarseFactor), 1)
+        self.candidatePeaks = candidatePeaks
+
+    def extract(self, times: np.ndarray, mags: np.ndarray,
+                errors: np.ndarray=None) -> Dict[str, float]:
+        """Feature values by name. Like feets, ignores errors."""
+        t = times - np.min(times)
+        frequency = LombScargle(t, mags).autofrequency(**self.gridParams)
+        peak, peakPower = self._peak(t, mags, frequency)
+        features = self._lombScargleFeatures(times, mags, peakPower, peak,
+                                             frequency[peak])
+        features.update(self._harmonicsFeatures(t, mags, frequency,
+                                                 frequency[peak]))
+        return features
+
+    def _peak(self, t: np.ndarray, mags: np.ndarray,
+              frequency: np.ndarray) -> (int, float):
+        """Grid index and power of the periodogram's highest peak"""
+        model = LombScargle(t, mags)
+        if self.coarseFactor == 1 or len(frequency) < 2:
+            power = model.power(frequency, method=self.method,
+                                normalization=self.normalization)
+            peak = int(np.argmax(power))
+            return peak, power[peak]
+
+        coarsePower = model.power(frequency[::self.coarseFactor],
+                                  method=self.method,
+                                  normalization=self.normalization)
+        candidates = (np.argsort(coarsePower)[-self.candidatePeaks:] *
+                      self.coarseFactor)
+        window = np.arange(-self.coarseFactor, self.coarseFactor + 1)
+        local = np.unique(np.clip((candidates[:, None] + window).ravel(), 0,
+                                  len(frequency) - 1))
+        # the local grid is irregular so a direct method is used
+        localPower = model.power(frequency[local],
+                                 normalization=self.normalization)
+        best = int(np.argmax(localPower))
+        return int(local[best]), localPower[best]
+
+    def _peakFrequency(self, t: np.ndarray, mags: np.ndarray,
+                       frequency: np.ndarray) -> float:
+        return frequency[self._peak(t, mags, frequency)[0]]
+
+    def _lombScargleFeatures(self, times, mags, peakPower: float, peak: int,
+                             peakFrequency: float) -> Dict[str, float]:
+        period = 1 / peakFrequency
+
+        # feets passes the peak's grid index as 'fmax'; kept for parity
+        fap = ls_fap.false_alarm_probability(
+            peakPower, peak, times, mags, dy=0.01, method=self.fapMethod,
+            normalization=self.normalization)
+
+        # fold at twice the period
+        phase = np.mod(times, 2 * period) / (2 * period)
+        folded = mags[np.argsort(phase)]
+        n = len(folded)
+        s = np.cumsum(folded - np.mean(folded)) / (n * np.std(folded))
+        psiEta = (np.sum(np.diff(folded) ** 2) /
+                  ((n - 1) * np.var(folded)))
+        return {"PeriodLS": period, "Period_fit": fap,
+                "Psi_CS": np.max(s) - np.min(s), "Psi_eta": psiEta}
+
+    def _components(self, t: np.ndarray, mags: np.ndarray,
+                    frequency: np.ndarray,
+                    firstPeak: float=None) -> (List[float], np.ndarray,
+                                               np.ndarray):
+        """Finds frequency components by successive prewhitening. For each
+        component, the model of it and its harmonics, each fit to the LC as
+        prewhitened by the previous components, is subtracted from the LC.
+
+        :return: component frequencies, harmonic amplitudes and phases of
+        shape (components, harmonics)
+        """
+        amplitudes = np.empty((FREQUENCY_COMPONENTS, HARMONICS))
+        phases = np.empty((FREQUENCY_COMPONENTS, HARMONICS))
+        peaks = list()
+        residual = np.asarray(mags, dtype=np.float64)
+        for i in range(FREQUENCY_COMPONENTS):
+            if i == 0 and firstPeak is not None:
+                peak = firstPeak
+            else:
+                peak = self._peakFrequency(t, residual, frequency)
+
+            peaks.append(peak)
+            target = residual
+            for j in range(HARMONICS):
+                arg = 2 * np.pi * (j + 1) * peak * t
+                design = np.column_stack((np.sin(arg), np.cos(arg),
+                                          np.ones_like(t)))
+                coef = np.linalg.lstsq(design, target, rcond=None)[0]
+                amplitudes[i, j] = np.hypot(coef[0], coef[1])
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    phases[i, j] = np.arctan(coef[1] / coef[0])
+
+                residual = residual - design.dot(coef)
+
+        return peaks, amplitudes, phases
+
+    def _harmonicsFeatures(self, t, mags, frequency,
+                           firstPeak: float) -> Dict[str, float]:
+        _, amplitudes, phases = self._components(t, mags, frequency,
+                                                 firstPeak)
+        relPhases = phases - phases[:, :1]
+        features = dict()
+        for i in range(FREQUENCY_COMPONENTS):
+            for j in range(HARMONICS):
+                features["Freq%s_harmonics_amplitude_%s" % (i + 1, j)] = \
+                    amplitudes[i, j]
+                features["Freq%s_harmonics_rel_phase_%s" % (i + 1, j)] = \
+                    relPhases[i, j]
+
+        return features
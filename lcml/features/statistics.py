@@ -0,0 +1,162 @@
+"""Native batched implementation of feets' cheap moment and order statistic
+features. Rather than one LC and one extractor at a time, each feature is
+computed for a whole page of LCs at once with segmented NumPy reductions over
+the page's packed magnitudes (see `lcml.utils.packing`)."""
+from typing import Dict
+
+import numpy as np
+
+from lcml.utils.packing import (packOffsets, segmentIds, segmentLengths,
+                                segmentSorted, segmentSums, segmentTake)
+
+
+#: Lower and upper flux percentiles of feets' FluxPercentileRatioMid features
+FLUX_PERCENTILE_RATIOS = {"FluxPercentileRatioMid20": (0.40, 0.60),
+                          "FluxPercentileRatioMid35": (0.325, 0.675),
+                          "FluxPercentileRatioMid50": (0.25, 0.75),
+                          "FluxPercentileRatioMid65": (0.175, 0.825),
+                          "FluxPercentileRatioMid80": (0.10, 0.90)}
+
+
+def _ceilIndex(fraction: float, lengths: np.ndarray) -> np.ndarray:
+    return np.ceil(fraction * lengths).astype(np.int64)
+
+
+def _sortedMedian(sortedValues: np.ndarray, offsets: np.ndarray,
+                  start: np.ndarray, count: np.ndarray) -> np.ndarray:
+    """Medians of the `count[i]` sorted values of each array `i` starting at
+    index `start[i]`"""
+    return (segmentTake(sortedValues, offsets, start + (count - 1) // 2) +
+            segmentTake(sortedValues, offsets, start + count // 2)) / 2
+
+
+def _sortedPercentile(sortedValues: np.ndarray, offsets: np.ndarray,
+                      q: float) -> np.ndarray:
+    """`np.percentile` with linear interpolation of each array"""
+    position = q / 100 * (segmentLengths(offsets) - 1)
+    low = np.floor(position).astype(np.int64)
+    lowValues = segmentTake(sortedValues, offsets, low)
+    highValues = segmentTake(sortedValues, offsets,
+                             np.ceil(position).astype(np.int64))
+    return lowValues + (position - low) * (highValues - lowValues)
+
+
+class StatisticsExtractor:
+    """Computes feets' moment and order statistic features, matching feets'
+    definitions including their quirks, e.g., FluxPercentileRatioMid indices
+    are the ceilings of the percentiles' ranks. Where feets would raise, e.g.,
+    for too short LCs, values are NaN.
+
+    :param consecutiveStar: number of consecutive points beyond 2 standard
+    deviations counted by the Con feature
+    """
+    name = "statistics"
+    batched = True
+    features = (["Amplitude", "Beyond1Std", "Con", "Mean", "MedianAbsDev",
+                 "MedianBRP", "PercentAmplitude", "Q31", "Skew",
+                 "SmallKurtosis", "Std"] + sorted(FLUX_PERCENTILE_RATIOS))
+
+    def __init__(self, consecutiveStar: int=3):
+        self.consecutiveStar = consecutiveStar
+
+    def extract(self, times: np.ndarray, mags: np.ndarray,
+                errors: np.ndarray) -> Dict[str, float]:
+        """Feature values by name of a single LC"""
+        batch = self.extractPacked(times, mags, errors,
+                                   packOffsets([mags]))
+        return {f: values[0] for f, values in batch.items()}
+
+    def extractPacked(self, times: np.ndarray, mags: np.ndarray,
+                      errors: np.ndarray,
+                      offsets: np.ndarray) -> Dict[str, np.ndarray]:
+        """Feature values of each LC of a packed page
+
+        :param times: packed times
+        :param mags: packed magnitudes
+        :param errors: packed errors
+        :param offsets: offsets of the packed LCs
+        :return: array of each LC's values by feature name
+        """
+        n = segmentLengths(offsets)
+        seg = segmentIds(offsets)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self._extract(mags, errors, offsets, n, seg)
+
+    def _extract(self, mags, errors, offsets, n,
+                 seg) -> Dict[str, np.ndarray]:
+        features = dict()
+        mean = segmentSums(mags, offsets) / n
+        deviation = mags - mean[seg]
+        m2 = segmentSums(deviation ** 2, offsets) / n
+        std = np.sqrt(m2)
+        features["Mean"] = mean
+        features["Std"] = std
+        features["Skew"] = (segmentSums(deviation ** 3, offsets) / n /
+                            m2 ** 1.5)
+        c1 = n * (n + 1.0) / ((n - 1.0) * (n - 2) * (n - 3))
+        c2 = 3.0 * (n - 1) ** 2 / ((n - 2.0) * (n - 3))
+        features["SmallKurtosis"] = (
+            c1 * segmentSums((deviation / std[seg]) ** 4, offsets) - c2)
+
+        weights = 1 / errors ** 2
+        weightedMean = (segmentSums(mags * weights, offsets) /
+                        segmentSums(weights, offsets))
+        weightedDeviation = mags - weightedMean[seg]
+        weightedStd = np.sqrt(segmentSums(weightedDeviation ** 2, offsets) /
+                              (n - 1))
+        beyond = np.abs(weightedDeviation) > weightedStd[seg]
+        features["Beyond1Std"] = segmentSums(beyond.astype(np.float64),
+                                             offsets) / n
+
+        outside = (np.abs(deviation) > 2 * std[seg]).astype(np.int64)
+        features["Con"] = self._con(outside, offsets, n)
+
+        ordered = segmentSorted(mags, offsets)
+        zeros = np.zeros(len(n), dtype=np.int64)
+        median = _sortedMedian(ordered, offsets, zeros, n)
+        tail = _ceilIndex(0.05, n)
+        features["Amplitude"] = (
+            _sortedMedian(ordered, offsets, n - tail, tail) -
+            _sortedMedian(ordered, offsets, zeros, tail)) / 2
+
+        medianDeviation = np.abs(mags - median[seg])
+        features["MedianAbsDev"] = _sortedMedian(
+            segmentSorted(medianDeviation, offsets), offsets, zeros, n)
+        features["PercentAmplitude"] = (
+            np.maximum.reduceat(medianDeviation, offsets[:-1]) / median)
+
+        span = (segmentTake(ordered, offsets, n - 1) -
+                segmentTake(ordered, offsets, zeros)) / 10
+        near = np.abs(mags - median[seg]) < span[seg]
+        features["MedianBRP"] = segmentSums(near.astype(np.float64),
+                                            offsets) / n
+
+        features["Q31"] = (_sortedPercentile(ordered, offsets, 75) -
+                           _sortedPercentile(ordered, offsets, 25))
+
+        span5to95 = (segmentTake(ordered, offsets, _ceilIndex(0.95, n)) -
+                     segmentTake(ordered, offsets, _ceilIndex(0.05, n)))
+        for name, (low, high) in FLUX_PERCENTILE_RATIOS.items():
+            features[name] = (
+                segmentTake(ordered, offsets, _ceilIndex(high, n)) -
+                segmentTake(ordered, offsets, _ceilIndex(low, n))) / span5to95
+
+        return features
+
+    def _con(self, outside: np.ndarray, offsets: np.ndarray,
+             n: np.ndarray) -> np.ndarray:
+        """Fraction of windows of 'consecutiveStar' points all outside 2
+        standard deviations of the mean"""
+        k = self.consecutiveStar
+        windows = n - k + 1
+        cumulative = np.concatenate(([0], np.cumsum(outside)))
+        starts = np.arange(len(outside))
+        # windows starting at each point and lying within its LC
+        valid = starts + k <= np.repeat(offsets[1:], n)
+        full = np.zeros(len(outside), dtype=np.float64)
+        full[valid] = (cumulative[starts[valid] + k] -
+                       cumulative[starts[valid]]) == k
+        counts = segmentSums(full, offsets)
+        con = counts / windows
+        con[windows < 1] = np.nan
+        return con
@@ -16,13 +16,17 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 
 from lcml.pipeline.database.sqlite_db import (classLabelHistogram,
-                                              ensureDbTables,
-                                              selectFeaturesLabels)
+                                              connFromParams, ensureDbTables,
+                                              schemaPositions,
+                                              selectFeatureSchema,
+                                              selectFeatureStats,
+                                              selectFeaturesLabelsMasks)
 from lcml.pipeline.ml_pipeline_conf import MlPipelineConf
 from lcml.pipeline.stage.extract import getFeatureSpace
 from lcml.pipeline.stage.model_selection import (ClassificationMetrics,
                                                  ModelSelectionResult)
 from lcml.utils.dataset_util import convertClassLabels, reportClassHistogram
+from lcml.utils.executors import executorPool
 
 
 logger = logging.getLogger(__name__)
@@ -52,46 +56,52 @@ class BatchPipeline:
 
         ensureDbTables(self.dbParams)
 
-        lim = self.globalParams.get("dataLimit", float("inf"))
-        if self.loadStage.skip:
-            logger.info("Skip dataset loading")
-        else:
-            logger.info("Loading dataset...")
-            self.loadStage.fcn(self.loadStage.params, self.dbParams,
-                               self.loadStage.writeTable, lim)
-
-        if self.preprocStage.skip:
-            logger.info("Skip dataset cleaning")
-        else:
-            logger.info("Cleaning dataset...")
-            self.preprocStage.fcn(self.preprocStage.params, self.dbParams,
-                                  rawTable=self.loadStage.writeTable,
-                                  cleanTable=self.preprocStage.writeTable,
-                                  limit=lim)
-
-        logger.info("Cleaned dataset class histogram...")
-        histogram = classLabelHistogram(self.dbParams)
-        reportClassHistogram(histogram)
-        if self.extractStage.skip:
-            logger.info("Skip extract features")
-        else:
-            logger.info("Extracting features from LCs...")
-            extractStart = time.time()
-            self.extractStage.fcn(self.extractStage.params, self.dbParams,
-                                  lcTable=self.preprocStage.writeTable,
-                                  featuresTable=self.extractStage.writeTable,
-                                  limit=lim)
-            extractElapsed = timedelta(seconds=time.time() - extractStart)
-            logger.info("extracted in: %s", extractElapsed)
-
-        features, labels = selectFeaturesLabels(self.dbParams,
-                                                self.extractStage.writeTable,
-                                                lim)
+        # parallel stages share warm workers, released before model search
+        with executorPool(self.conf.executorConf):
+            lim = self.globalParams.get("dataLimit", float("inf"))
+            if self.loadStage.skip:
+                logger.info("Skip dataset loading")
+            else:
+                logger.info("Loading dataset...")
+                self.loadStage.fcn(self.loadStage.params, self.dbParams,
+                                   self.loadStage.writeTable, lim)
+
+            if self.preprocStage.skip:
+                logger.info("Skip dataset cleaning")
+            else:
+                logger.info("Cleaning dataset...")
+                self.preprocStage.fcn(self.preprocStage.params, self.dbParams,
+                                      rawTable=self.loadStage.writeTable,
+                                      cleanTable=self.preprocStage.writeTable,
+                                      limit=lim)
+
+            logger.info("Cleaned dataset class histogram...")
+            histogram = classLabelHistogram(self.dbParams)
+            reportClassHistogram(histogram)
+            if self.extractStage.skip:
+                logger.info("Skip extract features")
+            else:
+                logger.info("Extracting features from LCs...")
+                extractStart = time.time()
+                self.extractStage.fcn(
+                    self.extractStage.params, self.dbParams,
+                    lcTable=self.preprocStage.writeTable,
+                    featuresTable=self.extractStage.writeTable, limit=lim)
+                extractElapsed = timedelta(seconds=time.time() - extractStart)
+                logger.info("extracted in: %s", extractElapsed)
+
+        # optional subset of the features to learn from
+        featureNames = self.postprocStage.params.get("features")
+        features, labels, masks = selectFeaturesLabelsMasks(
+            self.dbParams, self.extractStage.writeTable, lim,
+            features=featureNames)
         if not features:
             logger.warning("No features returned from db")
             return
 
-        procFeats = self.postprocStage.fcn(features, self.postprocStage.params)
+        stats = self._featureStats(len(features), featureNames)
+        procFeats = self.postprocStage.fcn(features, self.postprocStage.params,
+                                           masks=masks, stats=stats)
 
         intLabels, labelMapping = convertClassLabels(labels)
         trainSize = self.globalParams["trainSize"]
@@ -107,7 +117,7 @@ class BatchPipeline:
         bestimator = bestRes.model
         if isinstance(bestimator, RandomForestClassifier):
             # connect feets features names with feature importances
-            feats = getFeatureSpace(self.extractStage.params).features_as_array_
+            feats = featureNames or self._schemaFeatures()
             namedImportances = list(zip(feats, bestimator.feature_importances_))
             namedImportances.sort(key=lambda x: x[1], reverse=True)
             t = PrettyTable(["rank", "feature name", "importance"])
@@ -127,6 +137,46 @@ class BatchPipeline:
         elapsedMins = timedelta(seconds=time.time() - startAll)
         logger.info("Pipeline completed in: %s", elapsedMins)
 
+    def _featureStats(self, vectorCount: int, featureNames: list=None):
+        """Statistics accumulated during extraction of the features table, if
+        they summarize exactly the loaded vectors, i.e., were recorded under
+        the fingerprint of its registered schema, projected onto the named
+        features if given"""
+        conn = connFromParams(self.dbParams)
+        cursor = conn.cursor()
+        schema = selectFeatureSchema(cursor,
+                                     self.dbParams["feature_schema_table"],
+                                     self.extractStage.writeTable)
+        stats = selectFeatureStats(cursor,
+                                   self.dbParams["feature_stats_table"],
+                                   self.extractStage.writeTable,
+                                   schema.fingerprint if schema else None)
+        if stats is not None and featureNames:
+            stats = stats.select(schemaPositions(
+                cursor, self.dbParams["feature_schema_table"],
+                self.extractStage.writeTable, featureNames))
+        conn.close()
+        if stats is not None and stats.count != vectorCount:
+            logger.info("Feature statistics of %s vectors do not match %s "
+                        "loaded", stats.count, vectorCount)
+            return None
+
+        return stats
+
+    def _schemaFeatures(self) -> list:
+        """Feature names of the features table's registered schema, else of
+        the extract stage's feature space"""
+        conn = connFromParams(self.dbParams)
+        schema = selectFeatureSchema(conn.cursor(),
+                                     self.dbParams["feature_schema_table"],
+                                     self.extractStage.writeTable)
+        conn.close()
+        if schema is None:
+            return list(getFeatureSpace(
+                self.extractStage.params).features_as_array_)
+
+        return [e.feature for e in schema.entries]
+
     @abstractmethod
     def modelSelectionPhase(self, trainFeatures, trainLabels,
                             classLabel) -> ModelSelectionResult:
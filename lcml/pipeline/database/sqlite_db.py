@@ -1,4 +1,8 @@
+from collections import namedtuple
+import hashlib
+import json
 import logging
+import pickle
 from typing import List, Union
 
 import numpy as np
@@ -7,6 +11,7 @@ from sqlite3 import Connection, Cursor
 
 from lcml.pipeline.database.serialization import deserArray
 from lcml.utils.context_util import joinRoot
+from lcml.utils.streaming_stats import FeatureStats
 
 
 logger = logging.getLogger(__name__)
@@ -25,13 +30,126 @@ CREATE_TABLE_LCS = ("CREATE TABLE IF NOT EXISTS %s ("
 INSERT_REPLACE_INTO_LCS = "INSERT OR REPLACE INTO %s VALUES (?, ?, ?, ?, ?)"
 
 
+#: CREATE TABLE for per-LC standardization statistics of the clean LC table.
+#: Original values are recovered as: value * scale + mean
+CREATE_TABLE_LC_STATS = ("CREATE TABLE IF NOT EXISTS %s ("
+                         "id text primary key, "
+                         "mag_mean real, "
+                         "mag_scale real, "
+                         "err_mean real, "
+                         "err_scale real)")
+
+
+INSERT_REPLACE_INTO_LC_STATS = ("INSERT OR REPLACE INTO %s "
+                                "VALUES (?, ?, ?, ?, ?)")
+
+
+#: CREATE TABLE for LCs rejected during cleaning with the reason, number of
+#: points removed and fingerprint of the cleaning params used
+CREATE_TABLE_LC_REJECTS = ("CREATE TABLE IF NOT EXISTS %s ("
+                           "id text primary key, "
+                           "label text, "
+                           "reason text, "
+                           "bogus_removed integer, "
+                           "outlier_removed integer, "
+                           "duplicates_merged integer, "
+                           "params text)")
+
+
+INSERT_REPLACE_INTO_LC_REJECTS = ("INSERT OR REPLACE INTO %s "
+                                  "VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+
+#: CREATE TABLE recording LCs whose feature extraction exceeded the time
+#: limit. 'params' is the fingerprint of the extract params in effect.
+CREATE_TABLE_EXTRACT_TIMEOUTS = ("CREATE TABLE IF NOT EXISTS %s ("
+                                 "id text primary key, "
+                                 "label text, "
+                                 "seconds real, "
+                                 "timeout real, "
+                                 "params text)")
+INSERT_REPLACE_INTO_EXTRACT_TIMEOUTS = ("INSERT OR REPLACE INTO %s VALUES "
+                                        "(?, ?, ?, ?, ?)")
+
+
+#: CREATE TABLE recording LCs whose feature extraction raised an exception.
+#: 'params' is the fingerprint of the extract params in effect.
+CREATE_TABLE_EXTRACT_ERRORS = ("CREATE TABLE IF NOT EXISTS %s ("
+                               "id text primary key, "
+                               "label text, "
+                               "exc_type text, "
+                               "traceback text, "
+                               "params text)")
+INSERT_REPLACE_INTO_EXTRACT_ERRORS = ("INSERT OR REPLACE INTO %s VALUES "
+                                      "(?, ?, ?, ?, ?)")
+
+
+#: CREATE TABLE for cache of individual feature values keyed by LC content
+#: hash, feature name and extractor library version
+CREATE_TABLE_FEATURE_CACHE = ("CREATE TABLE IF NOT EXISTS %s ("
+                              "lc_hash text, "
+                              "feature text, "
+                              "version text, "
+                              "value real, "
+                              "PRIMARY KEY (lc_hash, feature, version))")
+
+
+#: CREATE TABLE recording the effective params with which a stage produced a
+#: table, keyed by the name of the table written
+CREATE_TABLE_STAGE_PARAMS = ("CREATE TABLE IF NOT EXISTS %s ("
+                             "tableName text primary key, "
+                             "params text)")
+
+
+#: CREATE TABLE for the streaming statistics of a features table, see
+#: `lcml.utils.streaming_stats`, keyed by the features table's name. 'params'
+#: is the params fingerprint of the feature vectors summarized.
+CREATE_TABLE_FEATURE_STATS = ("CREATE TABLE IF NOT EXISTS %s ("
+                              "tableName text primary key, "
+                              "params text, "
+                              "stats blob)")
+
+
+#: CREATE TABLE for the feature schema registry. Each version of a features
+#: table's schema lists the features held by its vectors, in vector order,
+#: with the extractor computing each, the extractor's version and params, and
+#: the params fingerprint of the rows having the schema.
+CREATE_TABLE_FEATURE_SCHEMA = ("CREATE TABLE IF NOT EXISTS %s ("
+                               "tableName text, "
+                               "version integer, "
+                               "position integer, "
+                               "feature text, "
+                               "extractor text, "
+                               "extractorVersion text, "
+                               "extractorParams text, "
+                               "params text, "
+                               "PRIMARY KEY (tableName, version, position))")
+
+
+#: Registered feature of a features table's schema
+FeatureSchemaEntry = namedtuple("FeatureSchemaEntry",
+                                ["feature", "extractor", "extractorVersion",
+                                 "extractorParams"])
+
+
+#: Version of a features table's schema
+FeatureSchema = namedtuple("FeatureSchema", ["version", "fingerprint",
+                                             "entries"])
+
+
+#: CREATE TABLE for feature vectors. 'mask', if set, is the boolean array
+#: of the features skipped by budgeted extraction, whose values are NaN
 CREATE_TABLE_FEATURES = ("CREATE TABLE IF NOT EXISTS %s ("
                          "id text primary key, "
                          "label text, "
-                         "features text)")
+                         "features text, "
+                         "params text, "
+                         "mask text)")
 
 
-INSERT_REPLACE_INTO_FEATURES = "INSERT OR REPLACE INTO %s VALUES (?, ?, ?)"
+INSERT_REPLACE_INTO_FEATURES = ("INSERT OR REPLACE INTO %s "
+                                "(id, label, features, params, mask) "
+                                "VALUES (?, ?, ?, ?, ?)")
 
 
 SINGLE_COL_PAGED_SELECT_QRY = ("SELECT {0} FROM {1} "
@@ -44,6 +162,9 @@ SINGLE_COL_PAGED_SELECT_QRY = ("SELECT {0} FROM {1} "
 SELECT_FEATURES_LABELS_QRY = "SELECT label, features FROM %s"
 
 
+SELECT_FEATURES_LABELS_MASKS_QRY = "SELECT label, features, mask FROM %s"
+
+
 def connFromParams(dbParams: dict) -> Union[Connection, None]:
     p = joinRoot(dbParams["dbPath"])
     timeout = dbParams["timeout"]
@@ -61,9 +182,30 @@ def ensureDbTables(dbParams: dict):
     cursor = conn.cursor()
     for query, table in [(CREATE_TABLE_LCS, dbParams["raw_lc_table"]),
                          (CREATE_TABLE_LCS, dbParams["clean_lc_table"]),
-                         (CREATE_TABLE_FEATURES, dbParams["feature_table"])]:
+                         (CREATE_TABLE_LC_STATS,
+                          dbParams["clean_lc_stats_table"]),
+                         (CREATE_TABLE_LC_REJECTS,
+                          dbParams["clean_lc_reject_table"]),
+                         (CREATE_TABLE_FEATURES, dbParams["feature_table"]),
+                         (CREATE_TABLE_FEATURE_CACHE,
+                          dbParams["feature_cache_table"]),
+                         (CREATE_TABLE_EXTRACT_TIMEOUTS,
+                          dbParams["extract_timeout_table"]),
+                         (CREATE_TABLE_EXTRACT_ERRORS,
+                          dbParams["extract_error_table"]),
+                         (CREATE_TABLE_STAGE_PARAMS,
+                          dbParams["stage_params_table"]),
+                         (CREATE_TABLE_FEATURE_STATS,
+                          dbParams["feature_stats_table"]),
+                         (CREATE_TABLE_FEATURE_SCHEMA,
+                          dbParams["feature_schema_table"])]:
         _ensureTable(cursor, query, table)
 
+    # columns added after the table's original definition
+    ensureColumn(cursor, dbParams["feature_table"], "params", "text")
+    ensureColumn(cursor, dbParams["feature_table"], "mask", "text")
+    for table in ("extract_timeout_table", "extract_error_table"):
+        ensureColumn(cursor, dbParams[table], "params", "text")
     conn.commit()
 
 
@@ -72,6 +214,15 @@ def _ensureTable(cursor: Cursor, query: str, table: str):
     cursor.execute(query % table)
 
 
+def ensureColumn(cursor: Cursor, table: str, column: str, declaration: str):
+    """Adds a column to a table created before the column was defined"""
+    columns = [r[1] for r in cursor.execute("PRAGMA table_info(%s)" % table)]
+    if column not in columns:
+        logger.info("adding column: %s to table: %s", column, table)
+        cursor.execute("ALTER TABLE %s ADD COLUMN %s %s" % (table, column,
+                                                           declaration))
+
+
 _COUNT_QRY = "SELECT COUNT(*) from %s"
 def tableCount(cursor: Cursor, tableName: str) -> int:
     return [_ for _ in cursor.execute(_COUNT_QRY % tableName)][0][0]
@@ -113,6 +264,97 @@ def singleColPagingItr(cursor: Cursor,
             prevVal = rows[-1][columnIndex]
 
 
+def selectIdCosts(cursor: Cursor, table: str,
+                  missingFrom: tuple=None) -> List[tuple]:
+    """Selects the id and serialized times size in bytes, a proxy for length,
+    of each LC of a table. See `idRangePagesItr` for `missingFrom`."""
+    joinClause, whereClause, args = "", "", tuple()
+    if missingFrom is not None:
+        joinClause = ("LEFT JOIN %s o ON o.id = t.id AND o.params = ? "
+                      % missingFrom[0])
+        whereClause = "WHERE o.id IS NULL"
+        args = (missingFrom[1],)
+
+    query = "SELECT t.id, length(t.times) FROM %s t %s%s" % (table, joinClause,
+                                                             whereClause)
+    return cursor.execute(query, args).fetchall()
+
+
+def idRangePagesItr(cursor: Cursor, table: str, lowId: Union[str, None],
+                    highId: Union[str, None], pageSize: int=1000,
+                    missingFrom: tuple=None):
+    """Generator of pages (lists) of the rows of a table having text primary
+    key `id` in the range (lowId, highId], in id order. A bound of None leaves
+    that side of the range open.
+
+    :param missingFrom: optional tuple of (other table, params fingerprint).
+    If specified, only rows without a row of the same id and fingerprint in
+    the other table are selected.
+    """
+    prevId = "" if lowId is None else lowId
+    highClause = "" if highId is None else "AND t.id <= ? "
+    joinClause, joinArgs = "", tuple()
+    if missingFrom is not None:
+        joinClause = ("LEFT JOIN %s o ON o.id = t.id AND o.params = ? "
+                      % missingFrom[0])
+        highClause += "AND o.id IS NULL "
+        joinArgs = (missingFrom[1],)
+
+    query = ("SELECT t.* FROM %s t %sWHERE t.id > ? %sORDER BY t.id LIMIT ?" %
+             (table, joinClause, highClause))
+    highArgs = tuple() if highId is None else (highId,)
+    rows = True
+    while rows:
+        args = joinArgs + (prevId,) + highArgs + (pageSize,)
+        rows = cursor.execute(query, args).fetchall()
+        if rows:
+            prevId = rows[-1][0]
+            yield rows
+
+
+def planIdPartitions(cursor: Cursor, table: str, partitions: int,
+                     limit: float=float("inf"),
+                     sampleSize: int=10000) -> List[tuple]:
+    """Plans roughly equal-sized partitions of a table by its text primary key
+    `id` using quantiles of a sample of ids.
+
+    :param cursor: db cursor
+    :param table: table to partition
+    :param partitions: desired number of partitions
+    :param limit: only plan over the first `limit` ids
+    :param sampleSize: approximate number of ids sampled
+    :return: list of (lowId, highId) ranges, exclusive-inclusive, where None
+    denotes an open bound
+    """
+    count = tableCount(cursor, table)
+    upper = None
+    if limit < count:
+        count = int(limit)
+        upper = cursor.execute("SELECT id FROM %s ORDER BY id LIMIT 1 "
+                               "OFFSET ?" % table, (count - 1,)).fetchone()[0]
+
+    step = max(1, count // sampleSize)
+    query = "SELECT id FROM %s WHERE rowid %% ? = 0" % table
+    args = (step,)
+    if upper is not None:
+        query += " AND id <= ?"
+        args += (upper,)
+
+    sample = sorted(r[0] for r in cursor.execute(query, args))
+    bounds = []
+    for k in range(1, partitions):
+        if not sample:
+            break
+
+        b = sample[min(len(sample) - 1, len(sample) * k // partitions)]
+        if (not bounds or b > bounds[-1]) and (upper is None or b < upper):
+            bounds.append(b)
+
+    lows = [None] + bounds
+    highs = bounds + [upper]
+    return list(zip(lows, highs))
+
+
 def selectFeaturesLabels(dbParams: dict, featureTable: str,
                          limit: int=None) -> (List[np.ndarray], List[str]):
     """Selects light curve features and class labels"""
@@ -143,6 +385,302 @@ def selectFeaturesLabels(dbParams: dict, featureTable: str,
     return features, labels
 
 
+def selectFeaturesLabelsMasks(dbParams: dict, featureTable: str,
+                              limit: int=None,
+                              features: List[str]=None) -> (
+        List[np.ndarray], List[str], list):
+    """Selects light curve features, class labels and the masks of features
+    skipped by budgeted extraction. If the table has a registered schema,
+    only rows extracted under the schema's params fingerprint are selected.
+
+    :param features: optional subset of features to select, projected from
+    the vectors by their positions in the table's registered schema
+    :return: features, labels and for each LC its boolean mask or None if
+    extraction was unbudgeted
+    """
+    conn = connFromParams(dbParams)
+    cursor = conn.cursor()
+    ensureColumn(cursor, featureTable, "mask", "text")
+    schema = selectFeatureSchema(cursor, dbParams["feature_schema_table"],
+                                 featureTable)
+    positions = None
+    if features is not None:
+        positions = _schemaPositions(schema, featureTable, features)
+
+    query = SELECT_FEATURES_LABELS_MASKS_QRY % featureTable
+    args = ()
+    if schema is not None:
+        stale = cursor.execute("SELECT COUNT(*) FROM %s WHERE params IS NOT ?"
+                               % featureTable,
+                               (schema.fingerprint,)).fetchone()[0]
+        if stale:
+            logger.warning("Skipping %s feature vectors not of schema "
+                           "version %s", stale, schema.version)
+
+        query += " WHERE params=?"
+        args = (schema.fingerprint,)
+
+    if limit not in (None, float("inf")):
+        query += " LIMIT %s" % limit
+
+    labels = []
+    features = []
+    masks = []
+    for r in cursor.execute(query, args):
+        labels.append(r[0])
+        vector = deserArray(r[1])
+        if schema is not None and len(vector) != len(schema.entries):
+            conn.close()
+            raise ValueError("Feature vector of length %s does not match "
+                             "schema version %s of %s having length %s" %
+                             (len(vector), schema.version, featureTable,
+                              len(schema.entries)))
+
+        mask = None if r[2] is None else deserArray(r[2]).astype(bool)
+        if positions is not None:
+            vector = vector[positions]
+            mask = None if mask is None else mask[positions]
+        features.append(vector)
+        masks.append(mask)
+
+    conn.close()
+    masked = sum(1 for m in masks if m is not None and m.any())
+    if masked:
+        logger.info("Loaded %s feature vectors with masked features",
+                    masked)
+
+    return features, labels, masks
+
+
+def selectLcStats(dbParams: dict, uid: str) -> Union[tuple, None]:
+    """Selects the standardization statistics of a clean light curve.
+
+    :return: tuple of (magMean, magScale, errMean, errScale) or None if the LC
+    was not standardized
+    """
+    conn = connFromParams(dbParams)
+    cursor = conn.cursor()
+    query = ("SELECT mag_mean, mag_scale, err_mean, err_scale FROM %s "
+             "WHERE id=?" % dbParams["clean_lc_stats_table"])
+    row = cursor.execute(query, (uid,)).fetchone()
+    conn.close()
+    return row
+
+
+def selectLcStatsByIds(cursor: Cursor, statsTable: str,
+                       ids: List[str]) -> dict:
+    """Selects the standardization statistics of clean LCs
+
+    :return: mapping from id to (magMean, magScale, errMean, errScale) of the
+    standardized LCs among the ids
+    """
+    return {r[0]: tuple(r[1:]) for r in selectRowsByIds(cursor, statsTable,
+                                                         ids)}
+
+
+def writeStageParams(cursor: Cursor, paramsTable: str, tableName: str,
+                     params: dict):
+    """Records the params with which a stage produced `tableName`"""
+    query = "INSERT OR REPLACE INTO %s VALUES (?, ?)" % paramsTable
+    cursor.execute(query, (tableName, json.dumps(params, sort_keys=True)))
+
+
+def selectStageParams(cursor: Cursor, paramsTable: str,
+                      tableName: str) -> Union[dict, None]:
+    """Returns the params with which `tableName` was produced, if recorded"""
+    query = "SELECT params FROM %s WHERE tableName=?" % paramsTable
+    row = cursor.execute(query, (tableName,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def writeFeatureStats(cursor: Cursor, statsTable: str, featuresTable: str,
+                      fingerprint: str, stats: FeatureStats):
+    """Records the statistics of the vectors of `featuresTable` extracted with
+    params of the given fingerprint"""
+    query = "INSERT OR REPLACE INTO %s VALUES (?, ?, ?)" % statsTable
+    cursor.execute(query, (featuresTable, fingerprint,
+                           pickle.dumps(stats.toDict())))
+
+
+def selectFeatureStats(cursor: Cursor, statsTable: str, featuresTable: str,
+                       fingerprint: str=None) -> Union[FeatureStats, None]:
+    """Returns the recorded statistics of `featuresTable`, if any and, if a
+    fingerprint is given, if recorded under it"""
+    query = "SELECT params, stats FROM %s WHERE tableName=?" % statsTable
+    row = cursor.execute(query, (featuresTable,)).fetchone()
+    if row is None or fingerprint not in (None, row[0]):
+        return None
+
+    return FeatureStats.fromDict(pickle.loads(row[1]))
+
+
+def rebuildFeatureStats(cursor: Cursor, featuresTable: str, fingerprint: str,
+                        pageSize: int=1000) -> FeatureStats:
+    """Accumulates the statistics of the vectors of `featuresTable` extracted
+    with params of the given fingerprint, reading them a page at a time"""
+    stats = FeatureStats()
+    cursor.execute("SELECT features FROM %s WHERE params=?" % featuresTable,
+                   (fingerprint,))
+    while True:
+        rows = cursor.fetchmany(pageSize)
+        if not rows:
+            break
+
+        stats.update([deserArray(r[0]) for r in rows])
+
+    return stats
+
+
+def deleteFeatureStats(cursor: Cursor, statsTable: str, featuresTable: str):
+    query = "DELETE FROM %s WHERE tableName=?" % statsTable
+    cursor.execute(query, (featuresTable,))
+
+
+def writeFeatureSchema(cursor: Cursor, schemaTable: str, featuresTable: str,
+                       entries: List[FeatureSchemaEntry],
+                       fingerprint: str) -> int:
+    """Registers a new version of a features table's schema
+
+    :param entries: features in vector order
+    :param fingerprint: params fingerprint of the rows having the schema
+    :return: the schema version
+    """
+    row = cursor.execute("SELECT MAX(version) FROM %s WHERE tableName=?" %
+                         schemaTable, (featuresTable,)).fetchone()
+    version = (row[0] or 0) + 1
+    query = ("INSERT INTO %s VALUES (?, ?, ?, ?, ?, ?, ?, ?)" % schemaTable)
+    cursor.executemany(query, [(featuresTable, version, i) + tuple(e) +
+                               (fingerprint,)
+                               for i, e in enumerate(entries)])
+    return version
+
+
+def selectFeatureSchema(cursor: Cursor, schemaTable: str,
+                        featuresTable: str) -> Union[FeatureSchema, None]:
+    """Returns the latest version of a features table's schema, if any"""
+    row = cursor.execute("SELECT MAX(version) FROM %s WHERE tableName=?" %
+                         schemaTable, (featuresTable,)).fetchone()
+    if row[0] is None:
+        return None
+
+    rows = cursor.execute("SELECT feature, extractor, extractorVersion, "
+                          "extractorParams, params FROM %s "
+                          "WHERE tableName=? AND version=? ORDER BY position"
+                          % schemaTable, (featuresTable, row[0])).fetchall()
+    return FeatureSchema(row[0], rows[0][4] if rows else None,
+                         [FeatureSchemaEntry(*r[:4]) for r in rows])
+
+
+def schemaPositions(cursor: Cursor, schemaTable: str, featuresTable: str,
+                    features: List[str]) -> np.ndarray:
+    """Vector positions of the features in the latest schema of a features
+    table"""
+    schema = selectFeatureSchema(cursor, schemaTable, featuresTable)
+    return _schemaPositions(schema, featuresTable, features)
+
+
+def _schemaPositions(schema: Union[FeatureSchema, None], featuresTable: str,
+                     features: List[str]) -> np.ndarray:
+    if schema is None:
+        raise ValueError("No feature schema registered for: %s" %
+                         featuresTable)
+
+    positions = {e.feature: i for i, e in enumerate(schema.entries)}
+    missing = [f for f in features if f not in positions]
+    if missing:
+        raise ValueError("Features not in schema version %s of %s: %s" %
+                         (schema.version, featuresTable, missing))
+
+    return np.array([positions[f] for f in features], dtype=np.int64)
+
+
+def paramsFingerprint(params: dict) -> str:
+    """Short stable digest of a stage's params identifying the conditions
+    under which a row was produced"""
+    encoded = json.dumps(params, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+
+def deleteIds(cursor: Cursor, table: str, ids: List[str]):
+    cursor.executemany("DELETE FROM %s WHERE id=?" % table,
+                       [(i,) for i in ids])
+
+
+def selectRowsByIds(cursor: Cursor, table: str, ids: List[str],
+                    batchSize: int=500):
+    """Generator of the rows having the specified ids, selected in batches"""
+    for i in range(0, len(ids), batchSize):
+        batch = ids[i:i + batchSize]
+        query = "SELECT * FROM %s WHERE id IN (%s)" % (
+            table, ", ".join("?" * len(batch)))
+        for row in cursor.execute(query, batch).fetchall():
+            yield row
+
+
+def selectRejectedIds(cursor: Cursor, rejectTable: str,
+                      fingerprint: str=None, lowId: str=None,
+                      highId: str=None) -> dict:
+    """Returns mapping from id to rejection reason for LCs rejected during
+    cleaning, optionally only those rejected under the specified params
+    fingerprint and within the id range (lowId, highId]"""
+    query = "SELECT id, reason FROM %s WHERE 1" % rejectTable
+    args = tuple()
+    if fingerprint is not None:
+        query += " AND params=?"
+        args += (fingerprint,)
+    if lowId is not None:
+        query += " AND id > ?"
+        args += (lowId,)
+    if highId is not None:
+        query += " AND id <= ?"
+        args += (highId,)
+
+    return dict(cursor.execute(query, args))
+
+
+def selectCachedFeatures(cursor: Cursor, cacheTable: str, version: str,
+                         hashes: List[str]) -> dict:
+    """Selects cached feature values of several LCs.
+
+    :return: mapping from LC hash to dict of feature name to value
+    """
+    cached = dict()
+    if not hashes:
+        return cached
+
+    query = ("SELECT lc_hash, feature, value FROM %s WHERE version=? AND "
+             "lc_hash IN (%s)" % (cacheTable, ", ".join("?" * len(hashes))))
+    for h, feature, value in cursor.execute(query, [version] + hashes):
+        # sqlite stores NaN as NULL
+        cached.setdefault(h, dict())[feature] = (float("nan") if value is None
+                                                 else value)
+
+    return cached
+
+
+def insertCachedFeatures(cursor: Cursor, cacheTable: str, version: str,
+                         lcHash: str, names: List[str], values: List[float]):
+    query = "INSERT OR REPLACE INTO %s VALUES (?, ?, ?, ?)" % cacheTable
+    cursor.executemany(query, [(lcHash, str(n), version, float(v))
+                               for n, v in zip(names, values)])
+
+
+def rejectionHistogram(dbParams: dict) -> List[tuple]:
+    """Breakdown of cleaning rejections by class label and reason.
+
+    :return: list of (label, reason, count, ave bogus removed,
+    ave outliers removed) tuples
+    """
+    conn = connFromParams(dbParams)
+    cursor = conn.cursor()
+    query = ("SELECT label, reason, COUNT(*), AVG(bogus_removed), "
+             "AVG(outlier_removed) FROM %s GROUP BY label, reason "
+             "ORDER BY label, reason" % dbParams["clean_lc_reject_table"])
+    histogram = cursor.execute(query).fetchall()
+    conn.close()
+    return histogram
+
+
 def classLabelHistogram(dbParams: dict) -> dict:
     conn = connFromParams(dbParams)
     cursor = conn.cursor()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""Script timing each feets feature extractor individually on a sample of light
+curves stratified by class label. Reports mean and p95 cost of each extractor
+overall and by LC length, its features' NaN rates, and suggests features to
+exclude. The JSON report's 'excludedFeatures' may be used directly by the
+extractFeatures stage via its 'profilePath' param."""
+import argparse
+from collections import defaultdict
+from datetime import timedelta
+import json
+import random
+from sqlite3 import OperationalError
+import time
+from typing import Dict, List
+
+from feets import FeatureSpace
+import numpy as np
+from prettytable import PrettyTable
+
+from lcml.pipeline.database import STANDARD_INPUT_DATA_TYPES
+from lcml.pipeline.database.serialization import deserLc
+from lcml.pipeline.database.sqlite_db import connFromParams, selectRejectedIds
+
+
+DB_TIMEOUT = 60
+TABLE_NAME = "clean_lcs"
+REJECT_TABLE_NAME = "clean_lc_rejects"
+
+
+def _clargs():
+    p = argparse.ArgumentParser()
+    p.add_argument("--dbPath", "-p", required=True,
+                   help="rel path to sqlite db")
+    p.add_argument("--table", "-t", default=TABLE_NAME,
+                   help="table of light curves to sample")
+    p.add_argument("--rejectTable", default=REJECT_TABLE_NAME,
+                   help="table of LCs rejected during cleaning")
+    p.add_argument("--sampleSize", "-n", type=int, default=200,
+                   help="number of light curves to profile")
+    p.add_argument("--lengthBins", "-b", type=int, default=4,
+                   help="number of LC length quantile bins in report")
+    p.add_argument("--maxCostShare", type=float, default=0.25,
+                   help="suggest excluding an extractor's features if its "
+                        "share of total mean cost is at least this")
+    p.add_argument("--maxNanRate", type=float, default=0.5,
+                   help="suggest excluding a feature if it is NaN in at "
+                        "least this fraction of the sample")
+    p.add_argument("--seed", type=int, default=0, help="sampling seed")
+    p.add_argument("--output", "-o", help="path of JSON report")
+    return p.parse_args()
+
+
+def stratifiedSample(cursor, table: str, rejectTable: str, sampleSize: int,
+                     seed: int) -> List[str]:
+    """Samples LC ids with each class label represented in proportion to its
+    frequency, and by at least one LC. LCs rejected during cleaning are
+    omitted."""
+    try:
+        rejects = selectRejectedIds(cursor, rejectTable)
+    except OperationalError:
+        # db predating the rejects table
+        rejects = dict()
+
+    idsByLabel = defaultdict(list)
+    for uid, label in cursor.execute("SELECT id, label FROM %s" % table):
+        if uid not in rejects:
+            idsByLabel[label].append(uid)
+
+    total = sum(len(ids) for ids in idsByLabel.values())
+    rand = random.Random(seed)
+    sample = list()
+    for label, ids in sorted(idsByLabel.items()):
+        k = max(1, int(round(sampleSize * len(ids) / total)))
+        sample.extend(rand.sample(ids, min(k, len(ids))))
+
+    return sample
+
+
+def profileLc(fs: FeatureSpace, times: np.ndarray, mags: np.ndarray,
+              errors: np.ndarray) -> (Dict[str, float], Dict[str, float],
+                                      List[str]):
+    """Runs the FeatureSpace's extractors in its execution plan order, timing
+    each separately. An extractor's time excludes that of its dependencies.
+
+    :return: seconds by extractor name, feature values by name, names of
+    failed extractors
+    """
+    kwargs = fs.dict_data_as_array({"time": times, "magnitude": mags,
+                                    "error": errors})
+    seconds = dict()
+    features = dict()
+    failed = list()
+    for extractor in fs.excecution_plan_:
+        start = time.perf_counter()
+        try:
+            result = extractor.extract(features=features, **kwargs)
+        except Exception:
+            result = {f: np.nan for f in extractor.get_features()}
+            failed.append(extractor.name)
+
+        seconds[extractor.name] = time.perf_counter() - start
+        features.update(result)
+
+    return seconds, features, failed
+
+
+def _isNan(value) -> bool:
+    try:
+        return bool(np.any(np.isnan(np.asarray(value, dtype=np.float64))))
+    except (TypeError, ValueError):
+        return True
+
+
+def _costStats(seconds: List[float]) -> dict:
+    return {"meanSeconds": float(np.mean(seconds)),
+            "p95Seconds": float(np.percentile(seconds, 95))}
+
+
+def suggestExclusions(extractors: dict, nanRates: dict, maxCostShare: float,
+                      maxNanRate: float) -> List[str]:
+    """Features of extractors that are too costly, features that are too
+    often NaN, and features depending on either"""
+    excluded = {f for f, rate in nanRates.items() if rate >= maxNanRate}
+    for report in extractors.values():
+        if report["costShare"] >= maxCostShare:
+            excluded.update(report["features"])
+
+    changed = True
+    while changed:
+        changed = False
+        for report in extractors.values():
+            if (set(report["dependencies"]) & excluded and
+                    not set(report["features"]) <= excluded):
+                excluded.update(report["features"])
+                changed = True
+
+    return sorted(excluded)
+
+
+def main():
+    start = time.time()
+    args = _clargs()
+
+    dbParams = {"dbPath": args.dbPath, "timeout": DB_TIMEOUT}
+    conn = connFromParams(dbParams)
+    cursor = conn.cursor()
+    ids = stratifiedSample(cursor, args.table, args.rejectTable,
+                           args.sampleSize, args.seed)
+    if not ids:
+        print("Found no LCs!")
+        return
+
+    fs = FeatureSpace(data=STANDARD_INPUT_DATA_TYPES)
+    extractorFeatures = {e.name: sorted(e.get_features())
+                         for e in fs.excecution_plan_}
+    lengths = list()
+    seconds = defaultdict(list)
+    nanCounts = defaultdict(int)
+    failures = defaultdict(int)
+    query = "SELECT * FROM %s WHERE id=?" % args.table
+    for uid in ids:
+        row = cursor.execute(query, (uid,)).fetchone()
+        times, mags, errors = deserLc(*row[2:])
+        lengths.append(len(times))
+        lcSeconds, features, failed = profileLc(fs, times, mags, errors)
+        for name, s in lcSeconds.items():
+            seconds[name].append(s)
+
+        for name in failed:
+            failures[name] += 1
+
+        for name in fs.features_as_array_:
+            if _isNan(features.get(name, np.nan)):
+                nanCounts[name] += 1
+
+    conn.close()
+
+    lengths = np.array(lengths)
+    edges = np.unique(np.percentile(lengths, np.linspace(0, 100,
+                                                         args.lengthBins + 1)))
+    binOf = np.clip(np.searchsorted(edges, lengths, side="right") - 1, 0,
+                    max(len(edges) - 2, 0))
+    totalMean = sum(np.mean(s) for s in seconds.values())
+    nanRates = {f: nanCounts[f] / len(ids) for f in fs.features_as_array_}
+    extractors = dict()
+    for e in fs.excecution_plan_:
+        s = np.array(seconds[e.name])
+        report = _costStats(s)
+        report["costShare"] = (report["meanSeconds"] / totalMean
+                               if totalMean else 0.0)
+        report["features"] = extractorFeatures[e.name]
+        report["dependencies"] = sorted(e.get_dependencies())
+        report["failures"] = failures[e.name]
+        report["nanRate"] = max(nanRates[f] for f in report["features"]
+                                if f in nanRates)
+        if len(np.unique(lengths)) > 1 and np.all(s > 0):
+            # exponent k of a cost ~ length ** k fit
+            report["lengthExponent"] = float(
+                np.polyfit(np.log(lengths), np.log(s), 1)[0])
+
+        report["byLength"] = [
+            dict(minLength=int(lengths[binOf == b].min()),
+                 maxLength=int(lengths[binOf == b].max()),
+                 count=int(np.sum(binOf == b)),
+                 **_costStats(s[binOf == b]))
+            for b in np.unique(binOf)]
+        extractors[e.name] = report
+
+    excluded = suggestExclusions(extractors, nanRates, args.maxCostShare,
+                                 args.maxNanRate)
+
+    t = PrettyTable(["extractor", "mean ms", "p95 ms", "cost share",
+                     "NaN rate", "failures", "feature count"])
+    t.align = "l"
+    for name, r in sorted(extractors.items(),
+                          key=lambda x: x[1]["meanSeconds"], reverse=True):
+        t.add_row([name, "%.3f" % (1000 * r["meanSeconds"]),
+                   "%.3f" % (1000 * r["p95Seconds"]),
+                   "%.1f%%" % (100 * r["costShare"]),
+                   "%.2f" % r["nanRate"], r["failures"],
+                   len(r["features"])])
+    print(t)
+
+    columns = ["%s-%s" % (x["minLength"], x["maxLength"])
+               for x in next(iter(extractors.values()))["byLength"]]
+    t = PrettyTable(["extractor"] + ["mean/p95 ms, length %s" % c
+                                     for c in columns])
+    t.align = "l"
+    for name, r in sorted(extractors.items(),
+                          key=lambda x: x[1]["meanSeconds"], reverse=True):
+        t.add_row([name] + ["%.3f/%.3f" % (1000 * x["meanSeconds"],
+                                           1000 * x["p95Seconds"])
+                            for x in r["byLength"]])
+    print(t)
+    print("suggested excludedFeatures: %s" % excluded)
+
+    if args.output:
+        report = {"excludedFeatures": excluded,
+                  "sample": {"table": args.table, "size": len(ids),
+                             "seed": args.seed,
+                             "lengthBinEdges": edges.tolist()},
+                  "thresholds": {"maxCostShare": args.maxCostShare,
+                                 "maxNanRate": args.maxNanRate},
+                  "nanRates": nanRates,
+                  "extractors": extractors}
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+        print("wrote report: %s" % args.output)
+
+    print("elapsed: %s" % timedelta(seconds=time.time()-start))
+
+
+if __name__ == "__main__":
+    main()
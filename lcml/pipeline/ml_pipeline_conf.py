@@ -18,6 +18,10 @@ GLOBAL_PARAMS = "globalParams"
 DB_PARAMS = "database"
 
 
+#: execution backend of parallel stages, see `lcml.utils.executors`
+EXECUTOR = "executor"
+
+
 #: stage moving data from original format (e.g., csv) to db table
 LOAD_DATA_STAGE = "loadData"
 
@@ -55,7 +59,8 @@ class MlPipelineConf:
     def __init__(self, globalParams: dict, dbParams: dict,
                  loadStage: PipelineStage, preprocessStage: PipelineStage,
                  extractStage: PipelineStage, ftProcessStage: PipelineStage,
-                 searchStage: PipelineStage, serStage: PipelineStage):
+                 searchStage: PipelineStage, serStage: PipelineStage,
+                 executorConf: dict=None):
         self.globalParams = globalParams
         self.dbParams = dbParams
         self.loadStage = loadStage
@@ -64,6 +69,7 @@ class MlPipelineConf:
         self.postprocessStage = ftProcessStage
         self.searchStage = searchStage
         self.serStage = serStage
+        self.executorConf = executorConf
 
 
 def _makeInstance(modelClass: str, params: dict) -> object:
@@ -80,6 +86,11 @@ def loadPipelineConf(conf: dict) -> MlPipelineConf:
     dbParams = conf[DB_PARAMS]
     ensurePath(dbParams["dbPath"])
 
+    # parallel stages use the global executor unless they specify their own
+    executorConf = conf.get(EXECUTOR, None)
+    for stage in (PREPROCESS_DATA_STAGE, EXTRACT_FEATURES_STAGE):
+        conf[stage]["params"].setdefault(EXECUTOR, executorConf)
+
     # Stage: Load Data
     loadStage = _loadStage(conf[LOAD_DATA_STAGE], dbParams, loadFlatLcDataset)
 
@@ -124,7 +135,7 @@ def loadPipelineConf(conf: dict) -> MlPipelineConf:
     serialStage = _loadStage(stgCnf, dbParams, serPipelineResults)
     return MlPipelineConf(conf[GLOBAL_PARAMS], conf[DB_PARAMS], loadStage,
                           preprocStage, extractStage, postprocessStage,
-                          searchStage, serialStage)
+                          searchStage, serialStage, executorConf)
 
 
 def _loadStage(stageConf: dict, dbParams: dict, fcn) -> PipelineStage:
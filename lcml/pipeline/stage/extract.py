@@ -1,60 +1,958 @@
+from collections import Counter, deque
+import hashlib
+import json
 import logging
+from multiprocessing import cpu_count
 from sqlite3 import OperationalError
+from typing import Iterable, List, Set, Union
 
+import feets
 from feets import FeatureSpace
+from feets.extractors import extractor_of
+import numpy as np
 
+from lcml.features.multiband import MultiBandFeatureSpace, objectBand
+from lcml.features.native import NATIVE_EXTRACTORS, featureSpace
 from lcml.pipeline.database import STANDARD_INPUT_DATA_TYPES
-from lcml.pipeline.database.serialization import deserLc, serArray
-from lcml.pipeline.database.sqlite_db import (INSERT_REPLACE_INTO_FEATURES,
-                                              SINGLE_COL_PAGED_SELECT_QRY,
-                                              connFromParams,
-                                              reportTableCount)
-from lcml.utils.multiprocess import feetsExtract, reportingImapUnordered
+from lcml.pipeline.database.serialization import (deserArray, deserLc,
+                                                 serArray)
+from lcml.pipeline.database.sqlite_db import (
+    INSERT_REPLACE_INTO_EXTRACT_ERRORS, INSERT_REPLACE_INTO_EXTRACT_TIMEOUTS,
+    INSERT_REPLACE_INTO_FEATURES, FeatureSchema, FeatureSchemaEntry,
+    connFromParams, deleteFeatureStats,
+    deleteIds, ensureColumn, idRangePagesItr, insertCachedFeatures,
+    paramsFingerprint, planIdPartitions, rebuildFeatureStats,
+    reportTableCount,
+    selectCachedFeatures, selectFeatureSchema, selectFeatureStats,
+    selectIdCosts,
+    selectLcStatsByIds, selectRejectedIds, selectRowsByIds, selectStageParams,
+    writeFeatureSchema, writeFeatureStats, writeStageParams)
+from lcml.utils.context_util import joinRoot, loadJson
+from lcml.utils.executors import (PROCESS_POOL_BACKEND, executorBackend,
+                                  executorImapUnordered)
+from lcml.utils.multiprocess import (TIMEOUT_EXC_TYPE, WORKER_DIED_EXC_TYPE,
+                                     ExtractionFailure, feetsExtract,
+                                     feetsExtractMultiBand,
+                                     feetsExtractPacked, feetsExtractSubset,
+                                     initFeetsWorker,
+                                     reportingImapUnordered,
+                                     supervisedImapUnordered)
+from lcml.utils.packing import packArrays
+from lcml.utils.shared_arrays import (SharedSegmentPool, attachPackedColumns,
+                                      writePacked)
+from lcml.utils.streaming_stats import FeatureStats
 
 
 logger = logging.getLogger(__name__)
 
 
-def feetsJobGenerator(fs: FeatureSpace, dbParams: dict, tableName: str,
-                      selRows: str="*", offset: int=0):
-    """Returns a generator of tuples of the form:
-    (featureSpace (feets.FeatureSpace),  id (str), label (str), times (ndarray),
-     mags (ndarray), errors(ndarray))
-    Each tuple is used to perform a 'feets' feature extraction job.
+#: Default number of jobs sent to an extraction worker per message
+DEFAULT_CHUNKSIZE = 8
+
+#: Default bound on jobs in flight, in chunks per cpu, when the parent feeds
+#: workers individual LCs
+DEFAULT_IN_FLIGHT_CHUNKS_PER_CPU = 4
+
+#: Job ordering by LC primary key
+ID_ORDER = "id"
+
+#: Job ordering by decreasing estimated cost (longest processing time first),
+#: shortening the tail where few long LCs occupy few workers
+LARGEST_FIRST_ORDER = "largestFirst"
+
+#: Job ordering alternating the costliest and cheapest remaining LCs, which
+#: also shortens the tail while mixing LC sizes in flight
+INTERLEAVED_ORDER = "interleaved"
+
+#: Extraction mode where the parent process reads and deserializes LCs and
+#: sends them to workers
+PARENT_FED_MODE = "parentFed"
+
+#: Extraction mode where the parent only plans id-range partitions and each
+#: worker reads and decodes its own range from the db
+DB_RANGE_MODE = "dbRange"
+
+#: Default number of id-range partitions planned per cpu in `DB_RANGE_MODE`
+DEFAULT_PARTITIONS_PER_CPU = 4
+
+#: Extraction mode where the parent reads LCs and writes pages of packed arrays
+#: into shared memory segments from which workers read zero-copy views
+SHARED_MEMORY_MODE = "sharedMemory"
+
+#: Default number of shared memory segments (pages in flight) per cpu in
+#: `SHARED_MEMORY_MODE`
+DEFAULT_SEGMENTS_PER_CPU = 2
+
+#: Extraction mode where the LCs of an object's two bands, e.g., MACHO's R and
+#: B, are extracted together into one combined vector per object
+MULTI_BAND_MODE = "multiBand"
+
+#: Default separator of object id and band in the uids of `MULTI_BAND_MODE`
+#: LCs, e.g., '1-3319-10-R'
+DEFAULT_BAND_SEPARATOR = "-"
+
+#: Default number of shared memory segments, i.e., split LCs in flight, when
+#: extracting LCs above the 'splitLength' param
+DEFAULT_SPLIT_SEGMENTS = 2
+
+
+def costOrder(idCosts: List[tuple], ordering: str) -> List[str]:
+    """Orders ids by estimated cost.
+
+    :param idCosts: (id, cost) pairs
+    :param ordering: `LARGEST_FIRST_ORDER` or `INTERLEAVED_ORDER`
+    :return: ordered ids
+    """
+    ids = [i for i, _ in sorted(idCosts, key=lambda x: (-(x[1] or 0), x[0]))]
+    if ordering == LARGEST_FIRST_ORDER:
+        return ids
+    elif ordering == INTERLEAVED_ORDER:
+        half = (len(ids) + 1) // 2
+        large, small = ids[:half], ids[half:][::-1]
+        ordered = [None] * len(ids)
+        ordered[::2] = large
+        ordered[1::2] = small
+        return ordered
+    else:
+        raise ValueError("Unsupported job ordering: %s" % ordering)
+
+
+def lcPageGenerator(dbParams: dict, tableName: str, offset: int=0,
+                    missingFrom: tuple=None, ordering: str=ID_ORDER):
+    """Returns a generator of pages (lists) of LC table rows, omitting LCs
+    rejected during cleaning.
 
-    :param fs: feets.FeatureSpace object required to perform extraction
     :param dbParams: additional params
     :param tableName: table containing light curves
-    :param selRows: which rows to select from clean LC table
     :param offset: number of light curves to skip in db table before processing
+    :param missingFrom: optional (features table, params fingerprint); if
+    specified only LCs lacking a features row of that fingerprint and not
+    quarantined by a previous extraction are included
+    :param ordering: `ID_ORDER` for primary key order, otherwise an ordering
+    by estimated cost supported by `costOrder`
     """
     pageSize = dbParams["pageSize"]
     conn = connFromParams(dbParams)
     cursor = conn.cursor()
+    skipIds = set(selectRejectedIds(cursor, dbParams["clean_lc_reject_table"]))
+    if missingFrom is not None:
+        skipIds.update(quarantinedIds(cursor, dbParams, missingFrom[1]))
+
+    if ordering != ID_ORDER:
+        # only ids are held in memory; rows are selected a page at a time
+        ids = costOrder(selectIdCosts(cursor, tableName, missingFrom),
+                        ordering)[offset:]
+        ids = [i for i in ids if i not in skipIds]
+        for i in range(0, len(ids), pageSize):
+            pageIds = ids[i:i + pageSize]
+            rows = {r[0]: r for r in selectRowsByIds(cursor, tableName,
+                                                     pageIds, pageSize)}
+            yield [rows[uid] for uid in pageIds]
+
+        conn.close()
+        return
+
+    lowId = None
+    if offset:
+        row = cursor.execute("SELECT id FROM %s ORDER BY id LIMIT 1 OFFSET ?"
+                             % tableName, (offset - 1,)).fetchone()
+        if row is None:
+            conn.close()
+            return
+
+        lowId = row[0]
+
+    for page in idRangePagesItr(cursor, tableName, lowId, None, pageSize,
+                                missingFrom):
+        # skip stale rows of LCs rejected by a later cleaning run
+        yield [r for r in page if r[0] not in skipIds]
 
-    column = "id"  # PK
-    previousId = ""  # low precedence text value
-    rows = True
-    while rows:
-        _fmtPrevId = "\"{}\"".format(previousId)
-        q = SINGLE_COL_PAGED_SELECT_QRY.format(selRows, tableName, column,
-                                               _fmtPrevId, pageSize, offset)
-        cursor.execute(q)
-        rows = cursor.fetchall()
-        for r in rows:
+    conn.close()
+
+
+def feetsJobGenerator(dbParams: dict, tableName: str, offset: int=0,
+                      missingFrom: tuple=None, ordering: str=ID_ORDER):
+    """Returns a generator of tuples of the form:
+    (id (str), label (str), times (ndarray), mags (ndarray), errors(ndarray))
+    Each tuple is used to perform a 'feets' feature extraction job in a worker
+    initialized with `lcml.utils.multiprocess.initFeetsWorker`.
+
+    :param dbParams: additional params
+    :param tableName: table containing light curves
+    :param offset: number of light curves to skip in db table before processing
+    :param missingFrom: see `lcPageGenerator`
+    :param ordering: see `lcPageGenerator`
+    """
+    for page in lcPageGenerator(dbParams, tableName, offset, missingFrom,
+                                ordering):
+        for r in page:
             times, mags, errors = deserLc(*r[2:])
             # intended args for lcml.utils.multiprocess._feetsExtract
-            yield (fs, r[0], r[1], times, mags, errors)
+            yield (r[0], r[1], times, mags, errors)
+
+
+def multiBandJobGenerator(dbParams: dict, tableName: str, bands: List[str],
+                         separator: str, skipIds: Set[str]):
+    """Returns a generator of tuples of the form:
+    (object id, label, [(times, mags, errors) of each band],
+    [standardization statistics of each band's LC or None])
+    Each tuple is used to perform an extraction job in a worker initialized
+    with `lcml.utils.multiprocess.initFeetsWorker` given the bands. LCs are
+    read in id order, in which an object's bands are typically adjacent, and
+    held until all bands of their object have been read.
 
-        if rows:
-            previousId = rows[-1][0]
+    :param dbParams: additional params
+    :param tableName: table containing light curves with uids of the form
+    '<object id><separator><band>'
+    :param bands: names of the bands
+    :param separator: separator of object id and band
+    :param skipIds: ids of objects to skip
+    """
+    conn = connFromParams(dbParams)
+    cursor = conn.cursor()
+    statsTable = dbParams["clean_lc_stats_table"]
+    pending = dict()
+    for page in lcPageGenerator(dbParams, tableName):
+        lcStats = selectLcStatsByIds(cursor, statsTable,
+                                     [r[0] for r in page])
+        for r in page:
+            objectId, band = objectBand(r[0], separator)
+            if band not in bands or objectId in skipIds:
+                continue
+
+            byBand = pending.setdefault(objectId, dict())
+            byBand[band] = (r[1], deserLc(*r[2:]), lcStats.get(r[0]))
+            if len(byBand) == len(bands):
+                del pending[objectId]
+                # intended args for
+                # lcml.utils.multiprocess.feetsExtractMultiBand
+                yield (objectId, byBand[bands[0]][0],
+                       [byBand[b][1] for b in bands],
+                       [byBand[b][2] for b in bands])
 
     conn.close()
+    if pending:
+        logger.warning("Objects skipped lacking the LC of a band: %s",
+                       len(pending))
+
+
+def lcContentHash(row: tuple) -> str:
+    """Digest of a LC table row's serialized times, mags and errors. Computed
+    without deserializing the LC."""
+    h = hashlib.sha1()
+    for blob in row[2:5]:
+        h.update(blob if isinstance(blob, bytes) else str(blob).encode())
+
+    return h.hexdigest()
+
+
+def featureDependencyClosure(features: Iterable[str]) -> Set[str]:
+    """Adds to the given feets features all features they depend on, since a
+    `feets.FeatureSpace(only=...)` drops features whose dependencies are not
+    also selected"""
+    closure = set()
+    pending = list(features)
+    while pending:
+        f = pending.pop()
+        if f not in closure:
+            closure.add(f)
+            pending.extend(extractor_of(f).get_dependencies())
+
+    return closure
+
+
+def splitFeatureGroups(features: List[str], parts: int,
+                       nativeExtractors: dict=None) -> List[tuple]:
+    """Partitions features into at most `parts` groups that can be extracted
+    independently of each other. Features computed by the same extractor, or
+    depending on each other's extractors, are kept in one group, so that no
+    extractor runs in more than one group. Groups are balanced by their
+    number of extractors, and each is closed under feature dependencies.
+
+    :param features: features to partition
+    :param parts: maximum number of groups
+    :param nativeExtractors: native extractor params by name; features of
+    these extractors are grouped by native extractor
+    :return: tuples of feature names
+    """
+    native = {f: name for name in (nativeExtractors or ())
+              for f in NATIVE_EXTRACTORS[name].features}
+
+    def extractorName(f: str) -> str:
+        return native.get(f) or extractor_of(f).__name__
+
+    parent = dict()
+
+    def root(e: str) -> str:
+        while parent.setdefault(e, e) != e:
+            e = parent[e]
+        return e
+
+    for f in features:
+        e = root(extractorName(f))
+        if f not in native:
+            for d in extractor_of(f).get_dependencies():
+                parent[root(extractorName(d))] = e
+
+    components = dict()
+    for f in features:
+        components.setdefault(root(extractorName(f)), set()).add(f)
+
+    # largest components first, each to the group of fewest extractors
+    groups = [(0, set()) for _ in range(max(1, parts))]
+    for component in sorted(components.values(),
+                            key=lambda c: (-len({extractorName(f)
+                                                 for f in c}), min(c))):
+        i = min(range(len(groups)), key=lambda j: groups[j][0])
+        size, group = groups[i]
+        groups[i] = (size + len({extractorName(f) for f in component}),
+                     group | component)
+
+    return [tuple(sorted(featureDependencyClosure(g))) for _, g in groups
+            if g]
+
+
+def _serializedResult(result):
+    """Converts a `lcml.utils.multiprocess.feetsExtract` result to
+    (id, label, serialized features) or, if budgeted, (id, label, serialized
+    features, serialized mask), passing failures through"""
+    if isinstance(result, ExtractionFailure):
+        return result
+
+    if len(result) == 5:
+        uid, label, _, features, mask = result
+        return uid, label, serArray(features), serArray(mask)
+
+    uid, label, _, features = result
+    return uid, label, serArray(features)
+
+
+def _pageResults(results: list) -> (List[tuple], FeatureStats):
+    """Serializes a page's `lcml.utils.multiprocess.feetsExtract` results and
+    accumulates the statistics of its feature vectors"""
+    vectors = [r[3] for r in results if not isinstance(r, ExtractionFailure)]
+    return ([_serializedResult(r) for r in results],
+            FeatureStats.of(vectors))
+
+
+def _withStats(results: Iterable, batchSize: int):
+    """Passes through results of (id, label, serialized features, ...),
+    following each batch of them by the `FeatureStats` of their vectors"""
+    vectors = list()
+    for result in results:
+        yield result
+        if not isinstance(result, ExtractionFailure):
+            vectors.append(deserArray(result[2]))
+        if len(vectors) == batchSize:
+            yield FeatureStats.of(vectors)
+            vectors = list()
+
+    if vectors:
+        yield FeatureStats.of(vectors)
+
+
+def feetsExtractRange(args) -> List[tuple]:
+    """Worker function for `DB_RANGE_MODE` extracting features for all LCs of
+    an id range using the worker's own db connection. Requires the worker to
+    have been initialized with `lcml.utils.multiprocess.initFeetsWorker`.
+
+    :param args: tuple of dbParams, LC table name, lowId, highId and
+    missingFrom (see `lcPageGenerator`)
+    :return: list of (id, label, serialized features) tuples or
+    `ExtractionFailure`s, and the `FeatureStats` of the range's vectors
+    """
+    dbParams, tableName, lowId, highId, missingFrom = args
+    conn = connFromParams(dbParams)
+    cursor = conn.cursor()
+    skipIds = set(selectRejectedIds(cursor, dbParams["clean_lc_reject_table"],
+                                    lowId=lowId, highId=highId))
+    if missingFrom is not None:
+        skipIds.update(quarantinedIds(cursor, dbParams, missingFrom[1]))
+
+    results = []
+    stats = FeatureStats()
+    for page in idRangePagesItr(cursor, tableName, lowId, highId,
+                                pageSize=dbParams["pageSize"],
+                                missingFrom=missingFrom):
+        page = [r for r in page if r[0] not in skipIds]
+        if not page:
+            continue
+
+        columns = list(zip(*[deserLc(*r[2:]) for r in page]))
+        times, offsets = packArrays(columns[0])
+        mags, _ = packArrays(columns[1])
+        errors, _ = packArrays(columns[2])
+        pageResults, pageStats = _pageResults(feetsExtractPacked(
+            [r[0] for r in page], [r[1] for r in page], times, mags, errors,
+            offsets))
+        results.extend(pageResults)
+        stats.merge(pageStats)
+
+    conn.close()
+    return results, stats
+
+
+def feetsPageJobGenerator(segmentPool: SharedSegmentPool, dbParams: dict,
+                          tableName: str, missingFrom: tuple=None,
+                          ordering: str=ID_ORDER):
+    """Returns a generator of shared memory extraction jobs, one per page of
+    LCs, of the form: (segment name, offsets, ids, labels). Blocks while all
+    segments of the pool are in use."""
+    ids, labels, columns = list(), list(), ([], [], [])
+    for lc in feetsJobGenerator(dbParams, tableName, missingFrom=missingFrom,
+                                ordering=ordering):
+        ids.append(lc[0])
+        labels.append(lc[1])
+        for col, a in zip(columns, lc[2:]):
+            col.append(a)
+
+        if len(ids) == dbParams["pageSize"]:
+            written = writePacked(segmentPool, columns)
+            if written is None:
+                return
+
+            yield written + (ids, labels)
+            ids, labels, columns = list(), list(), ([], [], [])
+
+    if ids:
+        written = writePacked(segmentPool, columns)
+        if written is not None:
+            yield written + (ids, labels)
+
+
+def feetsExtractShared(args) -> (str, List[tuple]):
+    """Worker function for `SHARED_MEMORY_MODE` extracting features for a page
+    of LCs read from a shared memory segment. Requires the worker to have been
+    initialized with `lcml.utils.multiprocess.initFeetsWorker`.
+
+    :param args: tuple of segment name, offsets, ids, labels
+    :return: segment name, list of (id, label, serialized features) or
+    `ExtractionFailure`s, and the `FeatureStats` of the page's vectors
+    """
+    name, offsets, ids, labels = args
+    times, mags, errors = attachPackedColumns(name, 3, offsets)
+    return (name,) + _pageResults(feetsExtractPacked(ids, labels, times, mags,
+                                                     errors, offsets))
+
+
+def _deferLong(jobs: Iterable[tuple], splitLength: int, deferred: list):
+    """Passes through per-LC jobs of LCs shorter than `splitLength`, recording
+    the ids of the others in `deferred`"""
+    for job in jobs:
+        if len(job[2]) < splitLength:
+            yield job
+        else:
+            deferred.append(job[0])
+
+
+def splitJobGenerator(segmentPool: SharedSegmentPool, dbParams: dict,
+                      tableName: str, ids: List[str], groups: List[tuple],
+                      segments: dict):
+    """Returns a generator of jobs extracting the LCs of the given ids a
+    group of features at a time. Each LC is written once to a shared memory
+    segment, recorded in `segments` by id, and its jobs are of the form:
+    (id, label, segment name, offsets, features). Blocks while all segments of
+    the pool are in use."""
+    conn = connFromParams(dbParams)
+    cursor = conn.cursor()
+    pageSize = dbParams["pageSize"]
+    for i in range(0, len(ids), pageSize):
+        for r in selectRowsByIds(cursor, tableName, ids[i:i + pageSize],
+                                 pageSize):
+            written = writePacked(segmentPool,
+                                  [[a] for a in deserLc(*r[2:])])
+            if written is None:
+                conn.close()
+                return
+
+            segments[r[0]] = written[0]
+            for features in groups:
+                # intended args for feetsExtractPart
+                yield (r[0], r[1]) + written + (features,)
+
+    conn.close()
+
+
+def feetsExtractPart(args) -> Union[tuple, ExtractionFailure]:
+    """Worker function extracting a group of features of a LC read from a
+    shared memory segment. Requires the worker to have been initialized with
+    `lcml.utils.multiprocess.initFeetsWorker`.
+
+    :param args: tuple of id, label, segment name, offsets, features
+    :return: see `lcml.utils.multiprocess.feetsExtractSubset`
+    """
+    uid, label, name, offsets, features = args
+    times, mags, errors = attachPackedColumns(name, 3, offsets)
+    return feetsExtractSubset((uid, label, times, mags, errors, features,
+                               None))
+
+
+def _splitResults(extractParams: dict, dbParams: dict, lcTable: str,
+                  workerArgs: tuple, cursor, ids: List[str]):
+    """Generates (id, label, serialized features) of LCs whose feature sets
+    are split across workers. The parts of each LC's vector are reassembled
+    in the order of the feature space."""
+    names = [str(f) for f in
+             getFeatureSpace(extractParams).features_as_array_]
+    groups = splitFeatureGroups(names, extractParams.get("splitParts") or
+                                cpu_count(),
+                                extractParams.get("nativeExtractors"))
+    logger.info("Extracting LCs: %s in parts of features: %s", len(ids),
+                [len(g) for g in groups])
+    segments = dict()
+    pending = dict()
+    maxSegments = extractParams.get("splitSegments", DEFAULT_SPLIT_SEGMENTS)
+    with SharedSegmentPool(maxSegments) as segmentPool:
+        jobs = splitJobGenerator(segmentPool, dbParams, lcTable, ids, groups,
+                                 segments)
+        # parts are sent individually so that each may go to another worker
+        for result in _perLcImap(dict(extractParams, chunksize=1), dbParams,
+                                 feetsExtractPart, jobs, workerArgs, cursor):
+            uid = result[0]
+            remaining, values, failure = pending.get(uid,
+                                                     (len(groups), dict(),
+                                                      None))
+            if isinstance(result, ExtractionFailure):
+                failure = failure or result
+            else:
+                values.update(zip(result[2], result[3]))
+
+            remaining -= 1
+            if remaining:
+                pending[uid] = remaining, values, failure
+                continue
+
+            pending.pop(uid, None)
+            segmentPool.release(segments.pop(uid))
+            if failure is not None:
+                yield failure
+            else:
+                yield uid, result[1], serArray(np.array([values[f]
+                                                         for f in names]))
+
+
+def _perLcImap(extractParams: dict, dbParams: dict, func, jobs,
+               workerArgs: tuple, cursor):
+    """Runs jobs of a single LC each, whose first two args are the LC's id and
+    label. At most 'maxInFlight' jobs are drawn from `jobs` ahead of consumed
+    results. If the 'lcTimeout' param is set, workers exceeding that many
+    seconds on a LC are killed and the LC recorded in the timeouts table;
+    jobs are then drawn only as workers become idle. Timed out LCs and those
+    whose worker died yield `ExtractionFailure`s."""
+    timeout = extractParams.get("lcTimeout")
+    maxTasksPerChild = extractParams.get("maxTasksPerChild")
+    if not timeout:
+        chunksize = extractParams.get("chunksize", DEFAULT_CHUNKSIZE)
+        maxInFlight = (extractParams.get("maxInFlight") or
+                       DEFAULT_IN_FLIGHT_CHUNKS_PER_CPU * chunksize *
+                       cpu_count())
+        return executorImapUnordered(
+            extractParams.get("executor"), func, jobs,
+            initializer=initFeetsWorker, initargs=workerArgs,
+            chunksize=chunksize, maxTasksPerChild=maxTasksPerChild,
+            maxInFlight=maxInFlight)
+
+    logger.info("Extraction time limit per LC: %ss", timeout)
+    timeoutQry = (INSERT_REPLACE_INTO_EXTRACT_TIMEOUTS %
+                  dbParams["extract_timeout_table"])
+
+    def onTimeout(args: tuple, seconds: float) -> ExtractionFailure:
+        # stamped with the params fingerprint by the consumer of the results
+        cursor.execute(timeoutQry, (args[0], args[1], seconds, timeout,
+                                    None))
+        return ExtractionFailure(args[0], args[1], TIMEOUT_EXC_TYPE,
+                                 "exceeded %ss" % timeout)
+
+    def onCrash(args: tuple, exitcode: int) -> ExtractionFailure:
+        return ExtractionFailure(args[0], args[1], WORKER_DIED_EXC_TYPE,
+                                 "exit code: %s" % exitcode)
+
+    return supervisedImapUnordered(func, jobs, timeout=timeout,
+                                   onTimeout=onTimeout, onCrash=onCrash,
+                                   maxTasksPerChild=maxTasksPerChild,
+                                   initializer=initFeetsWorker,
+                                   initargs=workerArgs)
+
+
+def _parentFedResults(extractParams: dict, dbParams: dict, lcTable: str,
+                      workerArgs: tuple, cursor, missingFrom: tuple):
+    """Generates (id, label, serialized features) with the parent feeding LCs
+    to the workers. LCs of at least 'splitLength' points are deferred until
+    the others are done, then extracted with their feature sets split across
+    the workers, shortening the tail of the run."""
+    offset = 0 if missingFrom else extractParams.get("offset", 0)
+    logger.info("Beginning extraction at offset: %s in LC table", offset)
+    jobs = feetsJobGenerator(dbParams, lcTable, offset, missingFrom,
+                             extractParams.get("ordering", ID_ORDER))
+    splitLength = extractParams.get("splitLength")
+    deferred = list()
+    if splitLength:
+        jobs = _deferLong(jobs, splitLength, deferred)
+    for result in _perLcImap(extractParams, dbParams, feetsExtract, jobs,
+                             workerArgs, cursor):
+        yield _serializedResult(result)
+
+    if deferred:
+        yield from _splitResults(extractParams, dbParams, lcTable,
+                                 workerArgs, cursor, deferred)
+
+
+def _dbRangeResults(extractParams: dict, dbParams: dict, lcTable: str,
+                    workerArgs: tuple, limit: float, missingFrom: tuple):
+    """Generates (id, label, serialized features) with workers reading their
+    own id ranges from the db. Each range's results are followed by their
+    `FeatureStats`."""
+    conn = connFromParams(dbParams)
+    partitionCount = extractParams.get(
+        "partitions", DEFAULT_PARTITIONS_PER_CPU * cpu_count())
+    partitions = planIdPartitions(conn.cursor(), lcTable, partitionCount,
+                                  limit=limit)
+    conn.close()
+    logger.info("Planned %s id-range partitions", len(partitions))
+    jobs = [(dbParams, lcTable, low, high, missingFrom)
+            for low, high in partitions]
+    maxTasksPerChild = extractParams.get("maxTasksPerChild")
+    for batch, stats in executorImapUnordered(
+            extractParams.get("executor"), feetsExtractRange, jobs,
+            reportFrequency=1, initializer=initFeetsWorker,
+            initargs=workerArgs, maxTasksPerChild=maxTasksPerChild):
+        for result in batch:
+            yield result
+        yield stats
+
+
+def _sharedMemoryResults(extractParams: dict, dbParams: dict, lcTable: str,
+                         workerArgs: tuple, missingFrom: tuple):
+    """Generates (id, label, serialized features) with the parent sending
+    workers pages of LCs through recycled shared memory segments. Each page's
+    results are followed by their `FeatureStats`."""
+    maxSegments = extractParams.get("segments",
+                                    DEFAULT_SEGMENTS_PER_CPU * cpu_count())
+    with SharedSegmentPool(maxSegments) as segmentPool:
+        jobs = feetsPageJobGenerator(segmentPool, dbParams, lcTable,
+                                     missingFrom,
+                                     extractParams.get("ordering", ID_ORDER))
+        for name, batch, stats in reportingImapUnordered(
+                feetsExtractShared, jobs, reportFrequency=10,
+                initializer=initFeetsWorker, initargs=workerArgs,
+                maxTasksPerChild=extractParams.get("maxTasksPerChild")):
+            segmentPool.release(name)
+            for result in batch:
+                yield result
+            yield stats
+
+
+def _multiBandResults(extractParams: dict, dbParams: dict, lcTable: str,
+                      workerArgs: tuple, cursor, missingFrom: tuple):
+    """Generates (object id, label, serialized combined features) for objects
+    observed in two bands"""
+    bands = extractParams["bands"]
+    separator = extractParams.get("bandSeparator", DEFAULT_BAND_SEPARATOR)
+    logger.info("Extracting bands: %s", bands)
+    skipIds = set()
+    if missingFrom is not None:
+        # features rows and quarantined jobs are keyed by object id
+        skipIds.update(quarantinedIds(cursor, dbParams, missingFrom[1]))
+        skipIds.update(r[0] for r in cursor.execute(
+            "SELECT id FROM %s WHERE params=?" % missingFrom[0],
+            (missingFrom[1],)))
+
+    jobs = multiBandJobGenerator(dbParams, lcTable, bands, separator,
+                                 skipIds)
+    for result in _perLcImap(extractParams, dbParams, feetsExtractMultiBand,
+                             jobs, workerArgs, cursor):
+        yield _serializedResult(result)
+
+
+def _cachedJobGenerator(dbParams: dict, lcTable: str, featureNames: list,
+                        version: str, completed: deque, missingFrom: tuple,
+                        ordering: str):
+    """Generates extraction jobs for feets subset workers computing only the
+    features of each LC missing from the feature cache. LCs whose features
+    are all cached are appended to `completed` as
+    (id, label, hash, values by name) without being deserialized."""
+    cacheTable = dbParams["feature_cache_table"]
+    conn = connFromParams(dbParams)
+    cursor = conn.cursor()
+    required = frozenset(featureNames)
+    for page in lcPageGenerator(dbParams, lcTable, missingFrom=missingFrom,
+                                ordering=ordering):
+        hashes = [lcContentHash(r) for r in page]
+        cached = selectCachedFeatures(cursor, cacheTable, version, hashes)
+        for r, h in zip(page, hashes):
+            values = cached.get(h, dict())
+            missing = required.difference(values)
+            if not missing:
+                completed.append((r[0], r[1], h, values))
+                continue
+
+            subset = tuple(sorted(featureDependencyClosure(missing)))
+            times, mags, errors = deserLc(*r[2:])
+            # intended args for lcml.utils.multiprocess.feetsExtractSubset
+            yield (r[0], r[1], times, mags, errors, subset, (h, values))
+
+    conn.close()
+
+
+def _cachedResults(extractParams: dict, dbParams: dict, lcTable: str,
+                   workerArgs: tuple, cursor, missingFrom: tuple):
+    """Generates (id, label, serialized features) computing only features
+    missing from the feature cache, keyed by (LC content hash, feature name,
+    `featureVersion`). Newly computed values are added to the cache using the
+    caller's cursor."""
+    featureNames = list(getFeatureSpace(extractParams).features_as_array_)
+    version = featureVersion(extractParams)
+    cacheTable = dbParams["feature_cache_table"]
+    completed = deque()
+    jobs = _cachedJobGenerator(dbParams, lcTable, featureNames, version,
+                               completed, missingFrom,
+                               extractParams.get("ordering", ID_ORDER))
+    computedCount = 0
+    for result in _perLcImap(extractParams, dbParams, feetsExtractSubset, jobs,
+                             workerArgs, cursor):
+        if isinstance(result, ExtractionFailure):
+            yield result
+            continue
+
+        uid, label, names, values, (h, cachedValues) = result
+        insertCachedFeatures(cursor, cacheTable, version, h, names, values)
+        computedCount += len(names)
+        allValues = dict(cachedValues)
+        allValues.update(zip(names, values))
+        yield uid, label, serArray(np.array([allValues[f]
+                                             for f in featureNames]))
+        while completed:
+            yield _assembleCached(completed.popleft(), featureNames)
+
+    while completed:
+        yield _assembleCached(completed.popleft(), featureNames)
+
+    logger.info("Computed %s feature values missing from cache",
+                computedCount)
+
+
+def _assembleCached(cachedLc: tuple, featureNames: list) -> tuple:
+    uid, label, _, values = cachedLc
+    return uid, label, serArray(np.array([values[f] for f in featureNames]))
+
+
+def quarantinedIds(cursor, dbParams: dict,
+                   fingerprint: str=None) -> List[str]:
+    """Ids of LCs whose last extraction raised, killed its worker or timed
+    out, if given, under params of the fingerprint. LCs quarantined under
+    other params are extracted again."""
+    ids = set()
+    for table in (dbParams["extract_error_table"],
+                  dbParams["extract_timeout_table"]):
+        query, args = "SELECT id FROM %s" % table, ()
+        if fingerprint is not None:
+            query, args = query + " WHERE params=?", (fingerprint,)
+        ids.update(r[0] for r in cursor.execute(query, args))
+
+    return sorted(ids)
+
+
+def _retryJobGenerator(dbParams: dict, lcTable: str, ids: List[str],
+                       features: tuple):
+    """Generates feets subset jobs for the specified LCs"""
+    conn = connFromParams(dbParams)
+    for r in selectRowsByIds(conn.cursor(), lcTable, ids):
+        times, mags, errors = deserLc(*r[2:])
+        # intended args for lcml.utils.multiprocess.feetsExtractSubset
+        yield (r[0], r[1], times, mags, errors, features, None)
+
+    conn.close()
+
+
+def _retryResults(extractParams: dict, dbParams: dict, lcTable: str,
+                  workerArgs: tuple, cursor, fingerprint: str):
+    """Generates (id, label, serialized features) for only the LCs
+    quarantined under params of the fingerprint, extracting a reduced
+    feature set which excludes the 'retryExcludedFeatures' param. Features
+    vectors keep the full set's layout with NaN for the reduced set's
+    excluded features. LCs quarantined under other params are left to a
+    resumed extraction of the current params."""
+    featureNames = list(getFeatureSpace(extractParams).features_as_array_)
+    retryExcluded = set(extractParams.get("retryExcludedFeatures", []))
+    reduced = featureDependencyClosure(set(featureNames) - retryExcluded)
+    if reduced & retryExcluded:
+        logger.warning("Retry retains excluded features required by others: "
+                       "%s", sorted(reduced & retryExcluded))
+
+    ids = quarantinedIds(cursor, dbParams, fingerprint)
+    logger.info("Retrying %s quarantined LCs without features: %s", len(ids),
+                sorted(retryExcluded))
+    jobs = _retryJobGenerator(dbParams, lcTable, ids, tuple(sorted(reduced)))
+    for result in _perLcImap(extractParams, dbParams, feetsExtractSubset, jobs,
+                             workerArgs, cursor):
+        if isinstance(result, ExtractionFailure):
+            yield result
+            continue
+
+        uid, label, names, values, _ = result
+        byName = dict(zip(names, values))
+        yield uid, label, serArray(np.array([byName.get(f, np.nan)
+                                             for f in featureNames]))
+
+
+def featureSchemaEntries(params: dict,
+                         names: List[str]) -> List[FeatureSchemaEntry]:
+    """Schema registry entries of the named features, in the given order,
+    recording the feets or native extractor computing each with its version
+    and params"""
+    native = dict()
+    for name, extractorParams in (params.get("nativeExtractors") or
+                                  dict()).items():
+        for f in NATIVE_EXTRACTORS[name].features:
+            native[f] = (name, extractorParams or dict())
+
+    bands = params.get("bands")
+    entries = list()
+    for name in names:
+        feature = name
+        if bands and name.endswith("_%s" % bands[1]):
+            # second band's feature of a multi-band vector
+            feature = name[:-len(bands[1]) - 1]
+
+        if feature in native:
+            extractor, extractorParams = native[feature]
+            version = "%s+%s" % (feets.VERSION,
+                                 paramsFingerprint({extractor:
+                                                    extractorParams}))
+        else:
+            cls = extractor_of(feature)
+            extractor = cls.__name__
+            extractorParams = cls.get_default_params()
+            version = feets.VERSION
+
+        entries.append(FeatureSchemaEntry(
+            name, extractor, version,
+            json.dumps(extractorParams, sort_keys=True, default=str)))
+
+    return entries
+
+
+def _evolvable(previousParams: dict, effectiveParams: dict) -> bool:
+    """Whether rows extracted with the previous params can be evolved to the
+    current ones, i.e., the params differ only in the features excluded"""
+    if not previousParams or effectiveParams.get("bands"):
+        return False
+
+    def others(params):
+        return {k: v for k, v in params.items() if k != "excludedFeatures"}
+
+    return others(previousParams) == others(effectiveParams)
+
+
+def _evolutionJobGenerator(dbParams: dict, featuresTable: str, lcTable: str,
+                           previousFingerprint: str, features: tuple):
+    """Generates feets subset jobs computing the specified features of the
+    LCs having features rows of the previous fingerprint, passing the rows'
+    serialized features and masks through"""
+    conn = connFromParams(dbParams)
+    cursor = conn.cursor()
+    query = ("SELECT f.id, f.label, f.features, f.mask, l.times, "
+             "l.magnitudes, l.errors FROM %s f JOIN %s l ON f.id = l.id "
+             "WHERE f.params = ?" % (featuresTable, lcTable))
+    for r in cursor.execute(query, (previousFingerprint,)):
+        times, mags, errors = deserLc(*r[4:])
+        # intended args for lcml.utils.multiprocess.feetsExtractSubset
+        yield (r[0], r[1], times, mags, errors, features, (r[2], r[3]))
+
+    conn.close()
+
+
+def evolveFeatureSchema(extractParams: dict, dbParams: dict, lcTable: str,
+                        featuresTable: str, workerArgs: tuple, cursor,
+                        schema: FeatureSchema, fingerprint: str):
+    """Evolves the rows of a features table's previous schema to the current
+    feature set without recomputing their retained features. Only features
+    added to the set are extracted; those removed are dropped. Evolved rows
+    take the current params fingerprint, so that resumed extraction skips
+    them, and their statistics replace the table's."""
+    names = [str(f) for f in
+             getFeatureSpace(extractParams).features_as_array_]
+    previous = [e.feature for e in schema.entries]
+    positions = {f: i for i, f in enumerate(previous)}
+    added = [f for f in names if f not in positions]
+    logger.info("Evolving feature schema version: %s adding: %s removing: "
+                "%s", schema.version, added,
+                sorted(set(previous).difference(names)))
+    subset = tuple(sorted(featureDependencyClosure(added)))
+    jobs = _evolutionJobGenerator(dbParams, featuresTable, lcTable,
+                                  schema.fingerprint, subset)
+    updateQry = ("UPDATE %s SET features=?, mask=?, params=? WHERE id=?" %
+                 featuresTable)
+    stats = FeatureStats()
+    vectors = list()
+    evolved = 0
+    if subset:
+        results = _perLcImap(extractParams, dbParams, feetsExtractSubset,
+                             jobs, workerArgs, cursor)
+    else:
+        # features were only removed, nothing to extract
+        results = ((j[0], j[1], (), (), j[6]) for j in jobs)
+    for result in results:
+        if isinstance(result, ExtractionFailure):
+            # a row that cannot be evolved is stale
+            deleteIds(cursor, featuresTable, [result.uid])
+            continue
+
+        uid, _, subsetNames, subsetValues, (serFeatures, serMask) = result
+        old = deserArray(serFeatures)
+        computed = dict(zip(subsetNames, subsetValues))
+        vector = np.array([old[positions[f]] if f in positions
+                           else computed[f] for f in names])
+        mask = None
+        if serMask is not None:
+            oldMask = deserArray(serMask).astype(bool)
+            mask = serArray(np.array([f in positions and oldMask[positions[f]]
+                                      for f in names]))
+        cursor.execute(updateQry, (serArray(vector), mask, fingerprint, uid))
+        vectors.append(vector)
+        evolved += 1
+        if len(vectors) == dbParams["pageSize"]:
+            stats.update(vectors)
+            vectors = list()
+
+    stats.update(vectors)
+    writeFeatureStats(cursor, dbParams["feature_stats_table"], featuresTable,
+                      fingerprint, stats)
+    logger.info("Evolved rows: %s", evolved)
+
+
+def excludedFeaturesOf(params: dict) -> List[str]:
+    """Features excluded by the 'excludedFeatures' param together with those
+    suggested by the report, if any, at the 'profilePath' param (relative to
+    the project root) written by `lcml.pipeline.debug.feets_profile`"""
+    excluded = set(params["excludedFeatures"])
+    profilePath = params.get("profilePath")
+    if profilePath:
+        excluded.update(loadJson(joinRoot(profilePath))["excludedFeatures"])
+
+    return sorted(excluded)
 
 
 def getFeatureSpace(params: dict) -> FeatureSpace:
-    return FeatureSpace(data=STANDARD_INPUT_DATA_TYPES,
-                        exclude=params["excludedFeatures"])
+    if params.get("bands"):
+        return MultiBandFeatureSpace(
+            STANDARD_INPUT_DATA_TYPES, params["bands"],
+            exclude=excludedFeaturesOf(params),
+            nativeExtractors=params.get("nativeExtractors"))
+
+    return featureSpace(STANDARD_INPUT_DATA_TYPES,
+                        exclude=excludedFeaturesOf(params),
+                        nativeExtractors=params.get("nativeExtractors"))
+
+
+def featureVersion(params: dict) -> str:
+    """Version of the implementation computing feature values, keying the
+    feature cache. Enabling or reconfiguring native extractors changes it."""
+    nativeExtractors = params.get("nativeExtractors")
+    if not nativeExtractors:
+        return feets.VERSION
+
+    return "%s+%s" % (feets.VERSION, paramsFingerprint(nativeExtractors))
 
 
 def feetsExtractFeatures(extractParams: dict, dbParams: dict, lcTable: str,
@@ -71,10 +969,19 @@ def feetsExtractFeatures(extractParams: dict, dbParams: dict, lcTable: str,
     :param limit: upper limit on the number of LC processed
     :returns feature vectors for each LC and list of corresponding class labels
     """
-    # recommended excludes (slow): "CAR_mean", "CAR_sigma", "CAR_tau"
+    # recommended excludes (slow): "CAR_mean", "CAR_sigma", "CAR_tau", unless
+    # computed by the 'car' native extractor
     # also produces nan's: "ls_fap"
-    logger.info("Excluded features: %s", extractParams["excludedFeatures"])
-    fs = getFeatureSpace(extractParams)
+    excludedFeatures = excludedFeaturesOf(extractParams)
+    logger.info("Excluded features: %s", excludedFeatures)
+    nativeExtractors = extractParams.get("nativeExtractors") or None
+    if nativeExtractors:
+        logger.info("Native extractors: %s", nativeExtractors)
+    lcBudget = extractParams.get("lcBudget")
+    if lcBudget is not None:
+        logger.info("Extraction time budget per LC: %ss", lcBudget)
+    mode = extractParams.get("mode", PARENT_FED_MODE)
+    logger.info("Extraction mode: %s", mode)
 
     ciFreq = dbParams["commitFrequency"]
     conn = connFromParams(dbParams)
@@ -82,33 +989,198 @@ def feetsExtractFeatures(extractParams: dict, dbParams: dict, lcTable: str,
     insertOrReplQry = INSERT_REPLACE_INTO_FEATURES % featuresTable
     reportTableCount(cursor, featuresTable, msg="before extracting")
 
-    offset = extractParams.get("offset", 0)
-    logger.info("Beginning extraction at offset: %s in LC table", offset)
+    # rows extracted under other params or from since recleaned LCs are stale
+    ensureColumn(cursor, featuresTable, "params", "text")
+    ensureColumn(cursor, featuresTable, "mask", "text")
+    effectiveParams = {"excludedFeatures": excludedFeatures,
+                       "data": STANDARD_INPUT_DATA_TYPES,
+                       "feetsVersion": feets.VERSION,
+                       "nativeExtractors": nativeExtractors,
+                       "lcBudget": lcBudget,
+                       "bands": extractParams.get("bands"),
+                       "lcTableParams": selectStageParams(
+                           cursor, dbParams["stage_params_table"], lcTable)}
+    fingerprint = paramsFingerprint(effectiveParams)
+    previousParams = selectStageParams(cursor, dbParams["stage_params_table"],
+                                       featuresTable)
+    writeStageParams(cursor, dbParams["stage_params_table"], featuresTable,
+                     effectiveParams)
+    missingFrom = None
+    if extractParams.get("resume", False):
+        logger.info("Resuming: extracting only LCs lacking features of "
+                    "params fingerprint: %s", fingerprint)
+        missingFrom = (featuresTable, fingerprint)
 
-    jobs = feetsJobGenerator(fs, dbParams, lcTable, offset=offset)
+    bands = extractParams.get("bands") or None
+    if (mode == MULTI_BAND_MODE) != bool(bands):
+        raise ValueError("mode: %s requires and alone supports 'bands'" %
+                         MULTI_BAND_MODE)
+    if bands and lcBudget is not None:
+        raise ValueError("'lcBudget' is unsupported in mode: %s" % mode)
+
+    workerArgs = (STANDARD_INPUT_DATA_TYPES, excludedFeatures,
+                  nativeExtractors, lcBudget, bands)
+    if lcBudget is not None:
+        # cached, retried and split vectors are assembled from unmasked
+        # values
+        for param in ("featureCache", "retry", "splitLength"):
+            if extractParams.get(param):
+                raise ValueError("'%s' is incompatible with 'lcBudget'" %
+                                 param)
+    if extractParams.get("splitLength") and extractParams.get("lcTimeout"):
+        # the supervisor draws jobs on the thread releasing split LCs' shared
+        # memory segments, so drawing could block on a segment forever
+        raise ValueError("'splitLength' is incompatible with 'lcTimeout'")
+    if mode != PARENT_FED_MODE:
+        for param in ("featureCache", "lcTimeout", "retry", "splitLength"):
+            if extractParams.get(param):
+                raise ValueError("'%s' requires mode: %s" % (param,
+                                                            PARENT_FED_MODE))
+    if (mode == DB_RANGE_MODE and
+            extractParams.get("ordering", ID_ORDER) != ID_ORDER):
+        raise ValueError("Workers of mode: %s read LCs in id order" % mode)
+    backend = executorBackend(extractParams.get("executor"))
+    logger.info("Executor backend: %s", backend)
+    if backend != PROCESS_POOL_BACKEND:
+        # these rely on local worker processes owned by the parent
+        if (mode == SHARED_MEMORY_MODE or extractParams.get("lcTimeout") or
+                extractParams.get("splitLength")):
+            raise ValueError("mode: %s, 'lcTimeout' and 'splitLength' "
+                             "require executor backend: %s" %
+                             (SHARED_MEMORY_MODE, PROCESS_POOL_BACKEND))
+
+    schemaTable = dbParams["feature_schema_table"]
+    schema = selectFeatureSchema(cursor, schemaTable, featuresTable)
+    if schema is None or schema.fingerprint != fingerprint:
+        if extractParams.get("evolveSchema", False):
+            if not missingFrom:
+                raise ValueError("'evolveSchema' requires 'resume'")
+            if (schema is not None and
+                    schema.fingerprint == paramsFingerprint(previousParams)
+                    and _evolvable(previousParams, effectiveParams)):
+                evolveFeatureSchema(extractParams, dbParams, lcTable,
+                                    featuresTable, workerArgs, cursor,
+                                    schema, fingerprint)
+            else:
+                logger.warning("Feature schema cannot be evolved; rows of "
+                               "other params will be recomputed")
+
+        names = [str(f) for f in
+                 getFeatureSpace(extractParams).features_as_array_]
+        version = writeFeatureSchema(
+            cursor, schemaTable, featuresTable,
+            featureSchemaEntries(extractParams, names), fingerprint)
+        logger.info("Registered feature schema version: %s", version)
+        conn.commit()
+
+    if extractParams.get("retry", False):
+        results = _retryResults(extractParams, dbParams, lcTable, workerArgs,
+                                cursor, fingerprint)
+    elif extractParams.get("featureCache", False):
+        results = _cachedResults(extractParams, dbParams, lcTable,
+                                 workerArgs, cursor, missingFrom)
+    elif mode == PARENT_FED_MODE:
+        results = _parentFedResults(extractParams, dbParams, lcTable,
+                                    workerArgs, cursor, missingFrom)
+    elif mode == DB_RANGE_MODE:
+        results = _dbRangeResults(extractParams, dbParams, lcTable,
+                                  workerArgs, limit, missingFrom)
+    elif mode == SHARED_MEMORY_MODE:
+        results = _sharedMemoryResults(extractParams, dbParams, lcTable,
+                                       workerArgs, missingFrom)
+    elif mode == MULTI_BAND_MODE:
+        results = _multiBandResults(extractParams, dbParams, lcTable,
+                                    workerArgs, cursor, missingFrom)
+    else:
+        raise ValueError("Unsupported extraction mode: %s" % mode)
+    if mode in (PARENT_FED_MODE, MULTI_BAND_MODE):
+        # vectors of single LC jobs reach the parent individually
+        results = _withStats(results, dbParams["pageSize"])
+
+    # rows kept by resume and retry runs are already summarized
+    statsTable = dbParams["feature_stats_table"]
+    stats = None
+    if missingFrom or extractParams.get("retry", False):
+        stats = selectFeatureStats(cursor, statsTable, featuresTable,
+                                   fingerprint)
+        if stats is None:
+            # e.g., dropped by a truncated run
+            stats = rebuildFeatureStats(cursor, featuresTable, fingerprint,
+                                        dbParams["pageSize"])
+            logger.info("Rebuilt statistics of stored vectors: %s",
+                        stats.count)
+    stats = stats or FeatureStats()
+
+    errorTable = dbParams["extract_error_table"]
+    timeoutTable = dbParams["extract_timeout_table"]
+    insertErrorQry = INSERT_REPLACE_INTO_EXTRACT_ERRORS % errorTable
+    stampTimeoutQry = "UPDATE %s SET params=? WHERE id=?" % timeoutTable
     lcCount = 0
     dbExceptions = 0
-    for uid, label, ftNames, features in reportingImapUnordered(feetsExtract,
-                                                                jobs):
-        # loop variables come from lcml.utils.multiprocess._feetsExtract
-        args = (uid, label, serArray(features))
+    failures = Counter()
+    succeeded = list()
+    maskedCount = 0
+    truncated = False
+    for args in results:
+        if isinstance(args, FeatureStats):
+            stats.merge(args)
+            continue
+
         try:
-            cursor.execute(insertOrReplQry, args)
+            if isinstance(args, ExtractionFailure):
+                # quarantine LC and drop features of any previous run
+                failures[args.excType] += 1
+                if args.excType != TIMEOUT_EXC_TYPE:
+                    cursor.execute(insertErrorQry, args + (fingerprint,))
+                else:
+                    cursor.execute(stampTimeoutQry, (fingerprint, args.uid))
+                deleteIds(cursor, featuresTable, [args.uid])
+            else:
+                mask = args[3] if len(args) > 3 else None
+                cursor.execute(insertOrReplQry,
+                               args[:3] + (fingerprint, mask))
+                succeeded.append(args[0])
+                if mask is not None and deserArray(mask).any():
+                    maskedCount += 1
+
             if lcCount % ciFreq == 0:
                 logger.info("commit progress: %s", lcCount)
+                _clearQuarantine(cursor, (errorTable, timeoutTable),
+                                 succeeded)
                 conn.commit()
         except OperationalError:
             logger.exception("Failed to insert %s", args)
             dbExceptions += 1
 
         if lcCount > limit:
+            truncated = True
             break
 
         lcCount += 1
 
+    _clearQuarantine(cursor, (errorTable, timeoutTable), succeeded)
+    if truncated:
+        # statistics would not match the rows written
+        deleteFeatureStats(cursor, statsTable, featuresTable)
+    else:
+        writeFeatureStats(cursor, statsTable, featuresTable, fingerprint,
+                          stats)
     reportTableCount(cursor, featuresTable, msg="after extracting")
     conn.commit()
     conn.close()
 
+    if maskedCount:
+        logger.info("LCs with features skipped for lack of time: %s",
+                    maskedCount)
+    if failures:
+        logger.warning("Quarantined LCs by failure: %s", dict(failures))
     if dbExceptions:
         logger.warning("Db exception count: %s", dbExceptions)
+
+
+def _clearQuarantine(cursor, tables: tuple, succeeded: List[str]):
+    """Removes successfully extracted LCs from the quarantine tables"""
+    for table in tables:
+        deleteIds(cursor, table, succeeded)
+
+    del succeeded[:]
@@ -2,16 +2,121 @@ from collections import Counter
 import logging
 import operator
 from typing import List
+import warnings
 
 import numpy as np
 from prettytable import PrettyTable
 
 from lcml.utils.format_util import fmtPct
+from lcml.utils.streaming_stats import FeatureStats, combineMoments
 
 
 logger = logging.getLogger(__name__)
 
 
+def maskedImpute(features: List[np.ndarray], masks: list,
+                 method: str="median"):
+    """Imputes the values of features skipped by budgeted extraction in-place.
+    Unlike other non-finite values, which are typically feets failures, these
+    are missing for lack of time only and are imputed from the feature's
+    values of other LCs.
+
+    :param features: feature vectors
+    :param masks: for each vector, its boolean mask of skipped features or None
+    :param method: 'median' for the median of the feature's finite unmasked
+    values; 'fixed' to leave masked values to `fixedValueImpute`
+    """
+    if method not in ("median", "fixed"):
+        raise ValueError("Unsupported masked impute method: %s" % method)
+
+    masked = [i for i, m in enumerate(masks) if m is not None and m.any()]
+    if not masked:
+        return
+
+    matrix = np.array(features, dtype=np.float64)
+    maskMatrix = np.zeros(matrix.shape, dtype=bool)
+    for i in masked:
+        maskMatrix[i] = masks[i]
+
+    counts = maskMatrix.sum(axis=0)
+    if method == "median":
+        observed = np.where(maskMatrix | ~np.isfinite(matrix), np.nan, matrix)
+        with warnings.catch_warnings():
+            # features masked for every LC have no median and stay NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            medians = np.nanmedian(observed, axis=0)
+
+        for i in masked:
+            features[i][masks[i]] = medians[masks[i]]
+
+    t = PrettyTable(["feature", "masked", "masked rate"])
+    for j in np.flatnonzero(counts)[np.argsort(-counts[counts > 0],
+                                               kind="mergesort")]:
+        t.add_row([j, counts[j], fmtPct(counts[j], len(features))])
+
+    logger.info("Masked features of %s vectors imputed by: %s\n%s",
+                len(masked), method, t)
+
+
+def streamingImputeStandardize(features: List[np.ndarray], stats: FeatureStats,
+                               impute: bool, standardize: bool,
+                               value: float=0.0, masks: list=None,
+                               maskedMethod: str="median") -> np.ndarray:
+    """Imputes and standardizes features in a single pass using statistics
+    accumulated during extraction. Equivalent to `maskedImpute`,
+    `fixedValueImpute` and then `StandardScaler`, except that masked values
+    are imputed with the medians estimated from the statistics' sample.
+
+    :param features: feature vectors summarized by 'stats'
+    :param stats: statistics of the vectors
+    :param impute: whether to impute non-finite values
+    :param standardize: whether to standardize features to zero mean and unit
+    variance
+    :param value: value imputed for non-finite values not masked
+    :param masks: optional masks of the features skipped by budgeted
+    extraction
+    :param maskedMethod: 'median' or 'fixed', see `maskedImpute`
+    :return: matrix of processed vectors
+    """
+    x = np.array(features, dtype=np.float64)
+    counts, means, m2s = stats.finiteCounts, stats.means, stats.m2s
+    if impute:
+        fill = np.full(x.shape[1], value)
+        masked = np.zeros(x.shape, dtype=bool)
+        if masks is not None and maskedMethod == "median":
+            for i, m in enumerate(masks):
+                if m is not None:
+                    masked[i] = m
+        maskedCounts = masked.sum(axis=0)
+        medians = stats.quantiles(0.5)
+        medians[~np.isfinite(medians)] = value
+
+        # imputed values join the finite ones as two groups of constants
+        counts, means, m2s = combineMoments(
+            counts, means, m2s, stats.nonFiniteCounts - maskedCounts, fill,
+            np.zeros_like(fill))
+        counts, means, m2s = combineMoments(
+            counts, means, m2s, maskedCounts, medians, np.zeros_like(fill))
+        x[~np.isfinite(x)] = value
+        x[masked] = np.broadcast_to(medians, x.shape)[masked]
+        logger.info("Imputed %s non-finite values of which masked: %s",
+                    int(stats.nonFiniteCounts.sum()),
+                    int(maskedCounts.sum()))
+
+    if standardize:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variances = m2s / counts
+        # as StandardScaler, features constant up to rounding error are only
+        # centered
+        eps = np.finfo(np.float64).eps
+        constant = ~(variances > counts * eps * variances +
+                     (counts * means * eps) ** 2)
+        scale = np.where(constant, 1.0, np.sqrt(variances))
+        x = (x - means) / scale
+
+    return x
+
+
 def fixedValueImpute(features: List[np.ndarray], value: float):
     """Sets non-finite feature values to specified value in-place"""
     imputes = Counter()
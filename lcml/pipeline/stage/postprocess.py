@@ -3,11 +3,36 @@ from typing import List
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 
-from lcml.pipeline.stage.feature_process import fixedValueImpute
+from lcml.pipeline.stage.feature_process import (fixedValueImpute,
+                                                  maskedImpute,
+                                                  streamingImputeStandardize)
+from lcml.utils.streaming_stats import FeatureStats
 
 
-def postprocessFeatures(features: List[np.ndarray], params: dict) -> np.ndarray:
+def postprocessFeatures(features: List[np.ndarray], params: dict,
+                        masks: list=None,
+                        stats: FeatureStats=None) -> np.ndarray:
+    """Imputes and standardizes features
+
+    :param features: feature vectors
+    :param params: stage params
+    :param masks: optional masks of the features skipped by budgeted
+    extraction, imputed as per the 'maskedImpute' param before any other
+    non-finite values
+    :param stats: optional statistics of the features accumulated during
+    extraction; unless the 'featureStats' param is false, features are then
+    processed in a single pass
+    """
+    if stats is not None and params.get("featureStats", True):
+        return streamingImputeStandardize(
+            features, stats, bool(params.get("impute", None)),
+            bool(params.get("standardize", None)), masks=masks,
+            maskedMethod=params.get("maskedImpute", "median"))
+
     if params.get("impute", None):
+        if masks is not None:
+            maskedImpute(features, masks,
+                         method=params.get("maskedImpute", "median"))
         fixedValueImpute(features, value=0.0)
     if params.get("standardize", None):
         features = StandardScaler().fit_transform(features)
@@ -1,14 +1,24 @@
+from collections import Counter
 import logging
+from multiprocessing import cpu_count
+
 import numpy as np
 
 from feets import preprocess
-from sklearn.preprocessing import StandardScaler
-
-from lcml.pipeline.database.sqlite_db import (INSERT_REPLACE_INTO_LCS,
-                                              connFromParams,
+from prettytable import PrettyTable
+
+from lcml.pipeline.database.sqlite_db import (INSERT_REPLACE_INTO_LC_REJECTS,
+                                              INSERT_REPLACE_INTO_LC_STATS,
+                                              INSERT_REPLACE_INTO_LCS,
+                                              connFromParams, deleteIds,
+                                              paramsFingerprint,
+                                              rejectionHistogram,
                                               reportTableCount,
-                                              singleColPagingItr, tableCount)
+                                              selectRejectedIds,
+                                              singleColPagingItr, tableCount,
+                                              writeStageParams)
 from lcml.pipeline.database.serialization import deserLc, serLc
+from lcml.utils.executors import executorImapUnordered
 from lcml.utils.format_util import fmtPct
 
 
@@ -23,6 +33,10 @@ DATA_BOGUS_REMOVED = "bogusRemoved"
 #: number of statistical outliers removed from original data
 DATA_OUTLIER_REMOVED = "outlierRemoved"
 
+#: Additional attribute for light curve Bunch data structure specifying the
+#: number of duplicate-epoch points merged away
+DATA_DUPLICATES_MERGED = "duplicatesMerged"
+
 #: cannot use LC because there is simply not enough data to go on
 INSUFFICIENT_DATA_REASON = "insufficient at start"
 
@@ -33,6 +47,14 @@ BOGUS_DATA_REASON = "insufficient due to bogus data"
 #: outliers
 OUTLIERS_REASON = "insufficient due to statistical outliers"
 
+#: cannot use LC because there is insufficient data after merging duplicate
+#: epochs
+DUPLICATES_REASON = "insufficient due to duplicate epochs"
+
+#: all reasons an LC may be rejected during cleaning
+REJECT_REASONS = {INSUFFICIENT_DATA_REASON, BOGUS_DATA_REASON, OUTLIERS_REASON,
+                  DUPLICATES_REASON}
+
 #: Research by Kim suggests it best that light curves have at least 80 data
 #: points for accurate classification
 SUFFICIENT_LC_DATA = 80
@@ -47,7 +69,8 @@ def preprocessLc(timeData, magData, errorData, removes, stdLimit, errorLimit):
 
     :returns processed lc as a tuple and failure reason (string)
     """
-    removedCounts = {DATA_BOGUS_REMOVED: 0, DATA_OUTLIER_REMOVED: 0}
+    removedCounts = {DATA_BOGUS_REMOVED: 0, DATA_OUTLIER_REMOVED: 0,
+                     DATA_DUPLICATES_MERGED: 0}
     if len(timeData) < SUFFICIENT_LC_DATA:
         return None, INSUFFICIENT_DATA_REASON, removedCounts
 
@@ -65,85 +88,384 @@ def preprocessLc(timeData, magData, errorData, removes, stdLimit, errorLimit):
     if len(_tm) < SUFFICIENT_LC_DATA:
         return None, OUTLIERS_REASON, removedCounts
 
+    # guarantees strictly increasing times
+    _tm, _mag, _err, merged = sortMergeLc(_tm, _mag, _err)
+    removedCounts[DATA_DUPLICATES_MERGED] = merged
+    if len(_tm) < SUFFICIENT_LC_DATA:
+        return None, DUPLICATES_REASON, removedCounts
+
     return [_tm, _mag, _err], None, removedCounts
 
 
+def _inverseVarianceWeights(errors: np.ndarray) -> np.ndarray:
+    """Weights 1 / error^2. Zero errors would get infinite weight so they are
+    floored at the smallest positive error, or all weights are uniform if there
+    is none."""
+    err = np.abs(errors)
+    positive = err[err > 0]
+    err = np.maximum(err, positive.min() if len(positive) else 1.0)
+    return 1.0 / (err * err)
+
+
+def _weightedSegmentMeans(mags: np.ndarray, errors: np.ndarray,
+                          starts: np.ndarray) -> (np.ndarray, np.ndarray):
+    """Inverse-variance weighted mean magnitude of consecutive segments
+    beginning at `starts` with propagated error `1 / sqrt(sum(weights))`"""
+    weights = _inverseVarianceWeights(errors)
+    weightSums = np.add.reduceat(weights, starts)
+    means = np.add.reduceat(weights * mags, starts) / weightSums
+    return means, 1.0 / np.sqrt(weightSums)
+
+
+def sortMergeLc(times, mags, errors) -> (np.ndarray, np.ndarray, np.ndarray,
+                                         int):
+    """Sorts an LC by time, only paying for the argsort if the times are out of
+    order, then merges points sharing a timestamp into their inverse-variance
+    weighted mean. The resulting times are strictly increasing.
+
+    :return: times, mags, errors and number of points merged away
+    """
+    times = np.asarray(times, dtype=np.float64)
+    mags = np.asarray(mags, dtype=np.float64)
+    errors = np.asarray(errors, dtype=np.float64)
+    diffs = np.diff(times)
+    if (diffs < 0).any():
+        order = np.argsort(times, kind="mergesort")
+        times = times[order]
+        mags = mags[order]
+        errors = errors[order]
+        diffs = np.diff(times)
+
+    distinct = diffs != 0
+    if distinct.all():
+        return times, mags, errors, 0
+
+    starts = np.flatnonzero(np.concatenate(([True], distinct)))
+    mergedMags, mergedErrors = _weightedSegmentMeans(mags, errors, starts)
+    return times[starts], mergedMags, mergedErrors, len(times) - len(starts)
+
+
 #: Default value for preprocessing param `std threshold`
 DEFAULT_STD_LIMIT = 5
 
 #: Default value for preprocessing param `error limit`
 DEFAULT_ERROR_LIMIT = 3
 
+#: Downsampling method averaging runs of time-consecutive points of near-equal
+#: counts, see `chunkAverageLc`
+BIN_DOWNSAMPLE = "bin"
+
+#: Downsampling method keeping one random point per stratum of consecutive
+#: points
+SUBSAMPLE_DOWNSAMPLE = "subsample"
+
+#: Stage param recorded for the clean table guaranteeing every LC has strictly
+#: increasing times, so consumers need not sort defensively
+TIME_SORTED_PARAM = "timeSorted"
+
+#: Default value for preprocessing param `downsampleSeed`
+DEFAULT_DOWNSAMPLE_SEED = 0
+
+
+def _timeStrata(times: np.ndarray, maxPoints: int) -> (np.ndarray, np.ndarray):
+    """Splits an LC into `maxPoints` strata of time-consecutive points having
+    near-equal counts.
+
+    :return: time ordering of points and start index (into that ordering) of
+    each stratum
+    """
+    if (np.diff(times) < 0).any():
+        order = np.argsort(times, kind="mergesort")
+    else:
+        order = np.arange(len(times))
+
+    starts = np.linspace(0, len(times), maxPoints, endpoint=False)
+    return order, starts.astype(np.int64)
+
+
+def chunkAverageLc(times, mags, errors, maxPoints: int) -> (
+        np.ndarray, np.ndarray, np.ndarray):
+    """Downsamples an LC to `maxPoints` chunks of time-consecutive points.
+    Chunks hold near-equal numbers of points, not equal time intervals, so
+    for irregularly sampled LCs densely observed stretches keep more chunks.
+    Each chunk's magnitude is the inverse-variance weighted mean of its points
+    with error propagated as `1 / sqrt(sum(weights))`. Chunk time is the mean
+    time of its points."""
+    order, starts = _timeStrata(times, maxPoints)
+    tm = times[order]
+    counts = np.diff(np.append(starts, len(tm)))
+    binTimes = np.add.reduceat(tm, starts) / counts
+    binMags, binErrors = _weightedSegmentMeans(mags[order], errors[order],
+                                               starts)
+    return binTimes, binMags, binErrors
+
+
+def subsampleLc(times, mags, errors, maxPoints: int,
+                seed: int=DEFAULT_DOWNSAMPLE_SEED) -> (np.ndarray, np.ndarray,
+                                                       np.ndarray):
+    """Downsamples an LC to `maxPoints` by keeping one randomly chosen point
+    from each stratum of time-consecutive points. Seeded per call so results
+    do not depend on processing order."""
+    order, starts = _timeStrata(times, maxPoints)
+    counts = np.diff(np.append(starts, len(times)))
+    rs = np.random.RandomState(seed)
+    picks = order[starts + (rs.random_sample(len(starts)) *
+                            counts).astype(np.int64)]
+    return times[picks], mags[picks], errors[picks]
+
+
+def downsampleLc(times, mags, errors, maxPoints: int, method: str,
+                 seed: int=DEFAULT_DOWNSAMPLE_SEED) -> (np.ndarray, np.ndarray,
+                                                       np.ndarray):
+    """Caps the number of points in an LC at `maxPoints` using the specified
+    method. LCs already within the cap are returned unchanged."""
+    if not maxPoints or len(times) <= maxPoints:
+        return times, mags, errors
+
+    times = np.asarray(times, dtype=np.float64)
+    mags = np.asarray(mags, dtype=np.float64)
+    errors = np.asarray(errors, dtype=np.float64)
+    if method == BIN_DOWNSAMPLE:
+        return chunkAverageLc(times, mags, errors, maxPoints)
+    elif method == SUBSAMPLE_DOWNSAMPLE:
+        return subsampleLc(times, mags, errors, maxPoints, seed=seed)
+    else:
+        raise ValueError("Unsupported downsample method: %s" % method)
+
+
+def standardizeArray(a: np.ndarray) -> (float, float):
+    """Standardizes an array in-place to zero mean and unit variance. As with
+    `sklearn.preprocessing.StandardScaler`, a zero-variance array is only
+    centered, i.e., its scale is taken to be 1.
+
+    :param a: float64 array modified in-place
+    :return: mean and scale used, such that original = a * scale + mean
+    """
+    if not len(a):
+        return 0.0, 1.0
+
+    mean = a.mean()
+    a -= mean
+    scale = np.sqrt(np.dot(a, a) / len(a))
+    if scale == 0.0:
+        scale = 1.0
+    else:
+        a /= scale
+
+    return float(mean), float(scale)
+
+
+def destandardizeArray(a: np.ndarray, mean: float, scale: float) -> np.ndarray:
+    """Inverts `standardizeArray` returning a new array in original units"""
+    return a * scale + mean
+
+
+#: Default number of LCs sent to a cleaning worker per message
+DEFAULT_CLEAN_CHUNKSIZE = 64
+
+#: Default bound on LCs in flight during cleaning, in chunks per cpu
+DEFAULT_CLEAN_IN_FLIGHT_CHUNKS_PER_CPU = 4
 
-def _standardizeArray(scaler: StandardScaler, a: np.ndarray) -> np.ndarray:
-    _reshaped = a.reshape(-1, 1)
-    _transformed = scaler.fit_transform(_reshaped)
-    return _transformed.reshape(-1)
+
+#: Worker process' cleaning params, set once by `initCleanWorker`
+_cleanParams = None
+
+
+def initCleanWorker(removes: set, stdLimit: float, errorLimit: float,
+                    maxPoints: int, downsample: str, downsampleSeed: int,
+                    standardize: bool):
+    """Executor initializer storing the worker's cleaning params so they need
+    not be pickled with every job"""
+    global _cleanParams
+    _cleanParams = (removes, stdLimit, errorLimit, maxPoints, downsample,
+                    downsampleSeed, standardize)
+
+
+def cleanLc(args) -> tuple:
+    """Worker function cleaning a single serialized LC. Requires the worker to
+    have been initialized with `initCleanWorker`.
+
+    :param args: tuple of LC table row values: id, label, serialized times,
+    mags and errors
+    :return: id, label, rejection reason (None if accepted), removed counts,
+    serialized clean LC, (mag mean, mag scale, error mean, error scale) if
+    standardized, whether downsampled
+    """
+    (removes, stdLimit, errorLimit, maxPoints, downsample, downsampleSeed,
+     standardize) = _cleanParams
+    uid, label = args[:2]
+    times, mags, errors = deserLc(*args[2:])
+    lc, issue, removedCounts = preprocessLc(times, mags, errors,
+                                            removes=removes,
+                                            stdLimit=stdLimit,
+                                            errorLimit=errorLimit)
+    if not lc:
+        if issue not in REJECT_REASONS:
+            raise ValueError("Bad reason: %s" % issue)
+
+        return uid, label, issue, removedCounts, None, None, False
+
+    downsampled = bool(maxPoints and len(lc[0]) > maxPoints)
+    if downsampled:
+        lc = list(downsampleLc(*lc, maxPoints=maxPoints, method=downsample,
+                               seed=downsampleSeed))
+
+    stats = None
+    if standardize:
+        lc[1] = np.asarray(lc[1], dtype=np.float64)
+        lc[2] = np.asarray(lc[2], dtype=np.float64)
+        magMean, magScale = standardizeArray(lc[1])
+        errMean, errScale = standardizeArray(lc[2])
+        stats = (magMean, magScale, errMean, errScale)
+
+    return uid, label, None, removedCounts, serLc(*lc), stats, downsampled
+
+
+def _cleanJobGenerator(dbParams: dict, rawTable: str, limit: float,
+                       knownRejects: dict, knownRejectCounts: Counter):
+    """Generates `cleanLc` jobs from raw LC rows, without deserializing them,
+    using its own connection, as it may run on an executor's thread. Known
+    rejects are counted and skipped."""
+    conn = connFromParams(dbParams)
+    itr = singleColPagingItr(conn.cursor(), rawTable, columnName="id",
+                             columnIndex=0, columnEscaped=True)
+    for i, r in enumerate(itr):
+        if i > limit:
+            break
+
+        if r[0] in knownRejects:
+            knownRejectCounts[knownRejects[r[0]]] += 1
+            continue
+
+        yield r
+
+    conn.close()
 
 
 def cleanLightCurves(params: dict, dbParams: dict, rawTable: str,
                      cleanTable: str, limit: float):
-    """Clean lightcurves and report details on discards."""
+    """Clean lightcurves and report details on discards. If standardization is
+    enabled, the per-LC means and scales are written to the clean LC stats
+    table so original magnitudes can be recovered with `destandardizeArray`.
+    Optionally caps LC length at `maxPoints` via `downsampleLc`. The effective
+    cleaning params are recorded in the stage params table.
+
+    Rejected LCs are recorded in the rejection table along with the
+    fingerprint of the cleaning params. On reruns with the same params, known
+    rejects are skipped without being deserialized.
+
+    LCs are cleaned in parallel by `cleanLc` using the 'executor' param's
+    backend (see `lcml.utils.executors`); only the parent writes to the db."""
     removes = set(params["filter"]) if "filter" in params else set()
     removes = removes.union(NON_FINITE_VALUES)
     stdLimit = params.get("stdLimit", DEFAULT_STD_LIMIT)
     errorLimit = params.get("errorLimit", DEFAULT_ERROR_LIMIT)
+    maxPoints = params.get("maxPoints", None)
+    downsample = params.get("downsample", BIN_DOWNSAMPLE)
+    downsampleSeed = params.get("downsampleSeed", DEFAULT_DOWNSAMPLE_SEED)
+    standardize = params.get("standardize", False)
+    effectiveParams = {"filter": sorted(v for v in removes if np.isfinite(v)),
+                       "stdLimit": stdLimit, "errorLimit": errorLimit,
+                       "standardize": standardize, "maxPoints": maxPoints,
+                       "downsample": downsample,
+                       "downsampleSeed": downsampleSeed,
+                       TIME_SORTED_PARAM: True}
+    fingerprint = paramsFingerprint(effectiveParams)
+
     commitFrequency = dbParams["commitFrequency"]
+    statsTable = dbParams["clean_lc_stats_table"]
+    featuresTable = dbParams["feature_table"]
+    rejectTable = dbParams["clean_lc_reject_table"]
     conn = connFromParams(dbParams)
     cursor = conn.cursor()
     reportTableCount(cursor, cleanTable, msg="before cleaning")
     insertOrReplace = INSERT_REPLACE_INTO_LCS % cleanTable
+    insertOrReplaceStats = INSERT_REPLACE_INTO_LC_STATS % statsTable
+    insertOrReplaceReject = INSERT_REPLACE_INTO_LC_REJECTS % rejectTable
     totalLcs = tableCount(cursor, rawTable)
     if limit != float("inf"):
         totalLcs = max(totalLcs, limit)
 
-    shortIssueCount = 0
-    bogusIssueCount = 0
-    outlierIssueCount = 0
+    knownRejects = selectRejectedIds(cursor, rejectTable, fingerprint)
+    logger.info("Skipping %s known rejects", len(knownRejects))
+    issueCounts = Counter()
+    knownRejectCounts = Counter()
     insertCount = 0
-    scaler = StandardScaler(copy=False)
-    standardize = params.get("standardize", False)
-    itr = singleColPagingItr(cursor, rawTable, columnName="id", columnIndex=0,
-                             columnEscaped=True)
-    for i, r in enumerate(itr):
-        times, mags, errors = deserLc(*r[2:])
-        lc, issue, _ = preprocessLc(times, mags, errors, removes=removes,
-                                    stdLimit=stdLimit, errorLimit=errorLimit)
-        if lc:
-            if standardize:
-                lc[1] = _standardizeArray(scaler, lc[1])
-                lc[2] = _standardizeArray(scaler, lc[2])
-
-            args = (r[0], r[1]) + serLc(*lc)
-            cursor.execute(insertOrReplace, args)
+    downsampledCount = 0
+    jobs = _cleanJobGenerator(dbParams, rawTable, limit, knownRejects,
+                              knownRejectCounts)
+    chunksize = params.get("chunksize", DEFAULT_CLEAN_CHUNKSIZE)
+    workerArgs = (removes, stdLimit, errorLimit, maxPoints, downsample,
+                  downsampleSeed, standardize)
+    results = executorImapUnordered(
+        params.get("executor"), cleanLc, jobs, reportFrequency=10000,
+        initializer=initCleanWorker, initargs=workerArgs, chunksize=chunksize,
+        maxInFlight=DEFAULT_CLEAN_IN_FLIGHT_CHUNKS_PER_CPU * chunksize *
+        cpu_count())
+    for result in results:
+        # loop variables come from cleanLc
+        uid, label, issue, removedCounts, lcBlobs, stats, downsampled = result
+        if issue is None:
+            downsampledCount += downsampled
+            if stats is not None:
+                cursor.execute(insertOrReplaceStats, (uid,) + stats)
+
+            cursor.execute(insertOrReplace, (uid, label) + lcBlobs)
+            deleteIds(cursor, rejectTable, [uid])
             insertCount += 1
             if insertCount % commitFrequency == 0:
                 logger.info("progress: %s", insertCount)
                 conn.commit()
-
-        elif issue == INSUFFICIENT_DATA_REASON:
-            shortIssueCount += 1
-        elif issue == BOGUS_DATA_REASON:
-            bogusIssueCount += 1
-        elif issue == OUTLIERS_REASON:
-            outlierIssueCount += 1
         else:
-            raise ValueError("Bad reason: %s" % issue)
-
-        if i >= limit:
-            break
-
+            issueCounts[issue] += 1
+            cursor.execute(insertOrReplaceReject, (
+                uid, label, issue, removedCounts[DATA_BOGUS_REMOVED],
+                removedCounts[DATA_OUTLIER_REMOVED],
+                removedCounts[DATA_DUPLICATES_MERGED], fingerprint))
+
+            # drop output of any earlier run that accepted this LC,
+            # including its features, which are loaded without a join
+            deleteIds(cursor, cleanTable, [uid])
+            deleteIds(cursor, statsTable, [uid])
+            deleteIds(cursor, featuresTable, [uid])
+
+    issueCounts.update(knownRejectCounts)
     reportTableCount(cursor, cleanTable, msg="after cleaning")
+    writeStageParams(cursor, dbParams["stage_params_table"], cleanTable,
+                     effectiveParams)
     conn.commit()
     conn.close()
 
     passRate = fmtPct(insertCount, totalLcs)
-    shortRate = fmtPct(shortIssueCount, totalLcs)
-    bogusRate = fmtPct(bogusIssueCount, totalLcs)
-    outlierRate = fmtPct(outlierIssueCount, totalLcs)
+    shortRate = fmtPct(issueCounts[INSUFFICIENT_DATA_REASON], totalLcs)
+    bogusRate = fmtPct(issueCounts[BOGUS_DATA_REASON], totalLcs)
+    outlierRate = fmtPct(issueCounts[OUTLIERS_REASON], totalLcs)
+    duplicateRate = fmtPct(issueCounts[DUPLICATES_REASON], totalLcs)
     logger.info("Dataset size: %d Pass rate: %s", totalLcs, passRate)
-    logger.info("Discard rates: short: %s bogus: %s outlier: %s", shortRate,
-                bogusRate, outlierRate)
+    logger.info("Discard rates: short: %s bogus: %s outlier: %s duplicate: %s",
+                shortRate, bogusRate, outlierRate, duplicateRate)
+    if maxPoints:
+        logger.info("Downsampled to %s points (%s): %s", maxPoints, downsample,
+                    fmtPct(downsampledCount, insertCount))
+
+    reportRejectionHistogram(dbParams)
+
+
+def reportRejectionHistogram(dbParams: dict):
+    """Logs a breakdown of rejected LCs by class label and reason using only
+    the rejection table"""
+    histogram = rejectionHistogram(dbParams)
+    if not histogram:
+        return
+
+    t = PrettyTable(["label", "reason", "count", "ave bogus removed",
+                     "ave outliers removed"])
+    t.align = "l"
+    for label, reason, count, aveBogus, aveOutliers in histogram:
+        t.add_row([label, reason, count, "%.1f" % aveBogus,
+                   "%.1f" % aveOutliers])
+
+    logger.info("Rejections by label\n%s", str(t))
 
 
 def lcFilterBogus(mjds, values, errors, removes):
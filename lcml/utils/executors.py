@@ -0,0 +1,177 @@
+"""Execution backends for the pipeline's parallel stages. A stage maps a worker
+function over a stream of jobs with `executorImapUnordered`; the backend is
+selected by the 'executor' config:
+
+    "executor": {"backend": "processPool" | "dask" | "serial",
+                 "params": {...}}
+
+The dask backend requires `dask.distributed`. It starts a `LocalCluster` unless
+the 'schedulerAddress' param names an existing cluster's scheduler.
+
+Within `executorPool`, process pool stages share one warm pool of 'workers'
+processes (default cpu count) having imported the 'preload' modules, see
+`lcml.utils.multiprocess.WorkerPool`."""
+from contextlib import contextmanager
+from itertools import islice
+import logging
+from multiprocessing import cpu_count
+from typing import Iterable
+
+from lcml.utils.multiprocess import (DEFAULT_PRELOAD_MODULES,
+                                     ensureInitialized,
+                                     reportingImapUnordered,
+                                     sharedWorkerPool)
+
+
+logger = logging.getLogger(__name__)
+
+
+#: Backend running jobs on a local `multiprocessing.Pool`
+PROCESS_POOL_BACKEND = "processPool"
+
+#: Backend running jobs on a `dask.distributed` cluster
+DASK_BACKEND = "dask"
+
+#: Backend running jobs in the calling process, e.g., for debugging
+SERIAL_BACKEND = "serial"
+
+
+def executorBackend(executorConf: dict) -> str:
+    return (executorConf or {}).get("backend", PROCESS_POOL_BACKEND)
+
+
+@contextmanager
+def executorPool(executorConf: dict):
+    """Context in which the stages run on the configured backend share its
+    workers. Only the process pool backend keeps workers between stages."""
+    if executorBackend(executorConf) != PROCESS_POOL_BACKEND:
+        yield None
+        return
+
+    params = (executorConf or {}).get("params", {})
+    with sharedWorkerPool(params.get("workers"),
+                          params.get("preload",
+                                     DEFAULT_PRELOAD_MODULES)) as pool:
+        yield pool
+
+
+def executorImapUnordered(executorConf: dict,
+                          func,
+                          jobArgs: Iterable[tuple],
+                          reportFrequency: int=100,
+                          initializer=None,
+                          initargs: tuple=(),
+                          chunksize: int=1,
+                          maxTasksPerChild: int=None,
+                          maxInFlight: int=None):
+    """Executes a function on a stream of jobs with the configured backend
+    yielding results in completion order. See `reportingImapUnordered` for
+    the parameters. `maxTasksPerChild` only applies to the process pool."""
+    backend = executorBackend(executorConf)
+    params = (executorConf or {}).get("params", {})
+    if backend == PROCESS_POOL_BACKEND:
+        return reportingImapUnordered(func, jobArgs, reportFrequency,
+                                      initializer, initargs, chunksize,
+                                      maxTasksPerChild, maxInFlight)
+    elif backend == DASK_BACKEND:
+        return daskImapUnordered(params, func, jobArgs, reportFrequency,
+                                 initializer, initargs, chunksize,
+                                 maxInFlight)
+    elif backend == SERIAL_BACKEND:
+        return _serialImapUnordered(func, jobArgs, initializer, initargs)
+    else:
+        raise ValueError("Unsupported executor backend: %s" % backend)
+
+
+def _serialImapUnordered(func, jobArgs: Iterable[tuple], initializer,
+                         initargs: tuple):
+    if initializer is not None:
+        initializer(*initargs)
+
+    for args in jobArgs:
+        yield func(args)
+
+
+def _runChunk(func, initializer, initargs: tuple, chunk: list) -> list:
+    """Dask task running a chunk of jobs. Runs the initializer the first time
+    the worker process sees it, emulating a process pool initializer."""
+    ensureInitialized(initializer, initargs)
+    return [func(args) for args in chunk]
+
+
+def daskImapUnordered(params: dict,
+                      func,
+                      jobArgs: Iterable[tuple],
+                      reportFrequency: int=100,
+                      initializer=None,
+                      initargs: tuple=(),
+                      chunksize: int=1,
+                      maxInFlight: int=None):
+    """Executes a function on a stream of jobs on a `dask.distributed` cluster.
+    Jobs are submitted in chunks of `chunksize` as earlier chunks complete,
+    keeping at most about `maxInFlight` jobs (by default 2 chunks per worker)
+    submitted but not yet consumed.
+
+    :param params: 'schedulerAddress' of an existing cluster, otherwise
+    'workers' (default cpu count) and 'threadsPerWorker' (default 1) of a
+    `LocalCluster` started for the duration of the job stream
+    """
+    try:
+        from dask.distributed import Client, LocalCluster, as_completed
+    except ImportError:
+        raise ImportError("The '%s' executor backend requires "
+                          "dask.distributed" % DASK_BACKEND)
+
+    cluster = None
+    address = params.get("schedulerAddress")
+    if address:
+        client = Client(address)
+    else:
+        cluster = LocalCluster(n_workers=params.get("workers", cpu_count()),
+                               threads_per_worker=params.get(
+                                   "threadsPerWorker", 1),
+                               processes=True)
+        client = Client(cluster)
+
+    logger.info("dask dashboard: %s", client.dashboard_link)
+    workerCount = len(client.scheduler_info()["workers"])
+    maxChunks = (max(1, maxInFlight // chunksize) if maxInFlight else
+                 2 * max(workerCount, 1))
+    jobs = iter(jobArgs)
+
+    def _submitNext():
+        chunk = list(islice(jobs, chunksize))
+        if not chunk:
+            return None
+
+        return client.submit(_runChunk, func, initializer, initargs, chunk,
+                             pure=False)
+
+    i = 0
+    try:
+        futures = as_completed()
+        for _ in range(maxChunks):
+            future = _submitNext()
+            if future is None:
+                break
+
+            futures.add(future)
+
+        for future in futures:
+            results = future.result()
+            future.release()
+            nextFuture = _submitNext()
+            if nextFuture is not None:
+                futures.add(nextFuture)
+
+            for result in results:
+                i += 1
+                yield result
+                if i % reportFrequency == 0:
+                    logger.info("dask completed: %s", i)
+    finally:
+        client.close()
+        if cluster is not None:
+            cluster.close()
+
+    logger.info("dask: total completed: %s", i)
@@ -1,56 +1,734 @@
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import partial
+import importlib
 import logging
-from multiprocessing import cpu_count, Pool
-from typing import Iterable
+from multiprocessing import (TimeoutError as PoolTimeoutError, cpu_count,
+                             Pipe, Pool, Process, resource_tracker)
+from multiprocessing.connection import wait
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Iterable, List, Union
+
+import numpy as np
+
+from lcml.features.multiband import MultiBandFeatureSpace
+from lcml.features.native import featureSpace
 
 
 logger = logging.getLogger(__name__)
 
 
+#: Traceback text kept with an `ExtractionFailure` is truncated to this length
+MAX_TRACEBACK_CHARS = 4000
+
+
+#: `ExtractionFailure.excType` of a job whose worker exceeded its time limit
+TIMEOUT_EXC_TYPE = "Timeout"
+
+#: `ExtractionFailure.excType` of a job whose worker process died
+WORKER_DIED_EXC_TYPE = "WorkerDied"
+
+
+#: Result of a feature extraction job that raised an exception, returned in
+#: place of the features so that a single bad LC does not abort the run
+ExtractionFailure = namedtuple("ExtractionFailure", ["uid", "label", "excType",
+                                                     "traceback"])
+
+
+def extractionFailure(uid: str, label: str) -> ExtractionFailure:
+    """Describes the exception currently being handled. Keeps the end of a
+    long traceback, which is nearest the cause."""
+    excType = sys.exc_info()[0]
+    tb = traceback.format_exc()
+    if len(tb) > MAX_TRACEBACK_CHARS:
+        tb = "..." + tb[-MAX_TRACEBACK_CHARS:]
+
+    return ExtractionFailure(uid, label, excType.__name__, tb)
+
+
+#: Worker process' feets.FeatureSpace, set once by `initFeetsWorker`
+_featureSpace = None
+
+#: Worker process' feets input data types, set once by `initFeetsWorker`
+_featureData = None
+
+#: Worker process' native extractor params, set once by `initFeetsWorker`
+_nativeExtractors = None
+
+#: Worker process' per-LC extraction time budget in seconds, set once by
+#: `initFeetsWorker`; None for unbudgeted extraction
+_lcBudget = None
+
+#: Worker process' FeatureSpaces restricted to subsets of features, built on
+#: first use by `feetsExtractSubset`
+_subsetFeatureSpaces = dict()
+
+#: Modules imported once by each `WorkerPool` worker on start
+DEFAULT_PRELOAD_MODULES = ("numpy", "scipy.stats", "feets",
+                           "lcml.features.native")
+
+#: Seconds a `WorkerPool` health check waits for each worker's reply
+DEFAULT_HEALTH_CHECK_TIMEOUT = 10.0
+
+#: Worker process' args of the last run of each initializer, see
+#: `ensureInitialized`
+_initializerArgs = dict()
+
+#: `WorkerPool` shared by the stages of a run, see `sharedWorkerPool`
+_sharedPool = None
+
+
+class InFlightLimiter:
+    """Bounds the number of jobs drawn from a job generator but not yet
+    returned as results. `multiprocessing.Pool.imap_unordered` otherwise
+    drains its input eagerly on a background thread, materializing every job
+    in the parent while workers lag behind."""
+    def __init__(self, maxInFlight: int):
+        self.maxInFlight = maxInFlight
+        self._semaphore = threading.BoundedSemaphore(maxInFlight)
+        self.submitted = 0
+        self.completed = 0
+        self.blockedSeconds = 0.0
+        self._stopped = False
+
+    def gate(self, jobArgs: Iterable[tuple]):
+        """Generator of the jobs, drawing each only once fewer than
+        `maxInFlight` jobs are in flight"""
+        jobs = iter(jobArgs)
+        while True:
+            start = time.monotonic()
+            self._semaphore.acquire()
+            self.blockedSeconds += time.monotonic() - start
+            if self._stopped:
+                return
+
+            try:
+                job = next(jobs)
+            except StopIteration:
+                self._semaphore.release()
+                return
+
+            self.submitted += 1
+            yield job
+
+    def release(self):
+        """Records the return of a job's result"""
+        self.completed += 1
+        self._semaphore.release()
+
+    def stop(self):
+        """Ends the job generator, e.g., once results are no longer consumed,
+        so that a pool's task feeder blocked on it finishes"""
+        self._stopped = True
+        try:
+            self._semaphore.release()
+        except ValueError:
+            # no job in flight, so the generator is not blocked
+            pass
+
+    @property
+    def inFlight(self) -> int:
+        return self.submitted - self.completed
+
+    def metrics(self) -> str:
+        return ("in flight: %s/%s submitted: %s producer blocked: %.1fs" %
+                (self.inFlight, self.maxInFlight, self.submitted,
+                 self.blockedSeconds))
+
+
+def ensureInitialized(initializer, initargs: tuple):
+    """Runs an initializer in the worker process unless its last run had the
+    same args, so that workers serving several stages keep each stage's
+    state once built"""
+    if initializer is None:
+        return
+
+    key = (initializer.__module__, initializer.__qualname__)
+    argsKey = repr(initargs)
+    if _initializerArgs.get(key) != argsKey:
+        initializer(*initargs)
+        _initializerArgs[key] = argsKey
+
+
+def _preloadWorker(modules: tuple):
+    """`WorkerPool` worker initializer importing heavy modules once"""
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            logger.warning("Worker could not preload module: %s", module)
+
+
+def _pooledJob(func, initializer, initargs: tuple, args) -> tuple:
+    """Runs a job on a `WorkerPool` worker after its stage's initializer
+
+    :return: job result and seconds spent on the job
+    """
+    ensureInitialized(initializer, initargs)
+    start = time.perf_counter()
+    result = func(args)
+    return result, time.perf_counter() - start
+
+
+class WorkerPool:
+    """Process pool kept warm across stages. Workers import heavy modules once
+    on start, and each stage's initializer runs only on a worker's first job
+    of the stage (see `ensureInitialized`). Tracks the time workers spend on
+    jobs to report utilization. Used as a context manager, the pool is closed
+    gracefully on exit, or terminated if exiting on an exception.
+
+    :param processes: number of workers, by default the cpu count
+    :param preload: modules imported by each worker on start
+    :param maxTasksPerChild: number of tasks after which a worker is replaced
+    by a fresh process; None for no limit
+    """
+    def __init__(self, processes: int=None,
+                 preload: Iterable[str]=DEFAULT_PRELOAD_MODULES,
+                 maxTasksPerChild: int=None):
+        self.processes = processes or cpu_count()
+        self.preload = tuple(preload or ())
+        self.maxTasksPerChild = maxTasksPerChild
+        self.jobs = 0
+        self.busySeconds = 0.0
+        self.stages = 0
+        self.restarts = 0
+        self._pool = None
+        self._startTime = time.monotonic()
+        self._start()
+
+    def _start(self):
+        # workers share the parent's tracker of shared memory segments, see
+        # `lcml.utils.shared_arrays.SharedSegmentPool`
+        resource_tracker.ensure_running()
+        self._pool = Pool(processes=self.processes,
+                          initializer=_preloadWorker,
+                          initargs=(self.preload,),
+                          maxtasksperchild=self.maxTasksPerChild)
+
+    def __enter__(self) -> "WorkerPool":
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        if excType is None:
+            self.close()
+        else:
+            self.terminate()
+
+    @property
+    def closed(self) -> bool:
+        return self._pool is None
+
+    def imapUnordered(self, func, jobArgs: Iterable[tuple],
+                      reportFrequency: int=100, initializer=None,
+                      initargs: tuple=(), chunksize: int=1,
+                      limiter: InFlightLimiter=None):
+        """Generator of results of a stage's jobs in completion order. See
+        `reportingImapUnordered` for the parameters.
+
+        :param limiter: optional limiter gating `jobArgs`, released as
+        results are consumed
+        """
+        if self.closed:
+            raise RuntimeError("Worker pool is closed")
+        if not self.healthCheck():
+            logger.warning("Restarting unhealthy worker pool")
+            self.restart()
+
+        self.stages += 1
+        stageStart = time.monotonic()
+        stageBusy = 0.0
+        job = partial(_pooledJob, func, initializer, initargs)
+        i = 0
+        try:
+            for i, (result, seconds) in enumerate(self._pool.imap_unordered(
+                    job, jobArgs, chunksize=chunksize), 1):
+                if limiter:
+                    limiter.release()
+
+                self.jobs += 1
+                self.busySeconds += seconds
+                stageBusy += seconds
+                yield result
+                if i % reportFrequency == 0:
+                    logger.info("multiprocessing completed: %s%s", i,
+                                " " + limiter.metrics() if limiter else "")
+        finally:
+            if limiter:
+                # results abandoned by the consumer are no longer drawn
+                limiter.stop()
+
+        elapsed = time.monotonic() - stageStart
+        logger.info("multiprocessing: total completed: %s%s utilization: "
+                    "%.0f%%", i, " " + limiter.metrics() if limiter else "",
+                    100 * _utilization(stageBusy, elapsed, self.processes))
+
+    def healthCheck(self,
+                    timeout: float=DEFAULT_HEALTH_CHECK_TIMEOUT) -> bool:
+        """Whether each of as many pings as there are workers is answered
+        within the timeout"""
+        if self.closed:
+            return False
+
+        pings = [self._pool.apply_async(os.getpid)
+                 for _ in range(self.processes)]
+        try:
+            for ping in pings:
+                ping.get(timeout)
+        except PoolTimeoutError:
+            logger.warning("Worker pool health check timed out after %ss",
+                           timeout)
+            return False
+
+        return True
+
+    def restart(self):
+        """Replaces all workers by fresh processes"""
+        self._pool.terminate()
+        self._pool.join()
+        self.restarts += 1
+        self._start()
+
+    def metrics(self) -> dict:
+        """Jobs run, seconds workers spent on them, pool uptime, and
+        utilization, the fraction of the workers' uptime spent on jobs"""
+        uptime = time.monotonic() - self._startTime
+        return {"workers": self.processes, "stages": self.stages,
+                "jobs": self.jobs, "busySeconds": self.busySeconds,
+                "uptimeSeconds": uptime, "restarts": self.restarts,
+                "utilization": _utilization(self.busySeconds, uptime,
+                                            self.processes)}
+
+    def close(self):
+        """Shuts the pool down once the workers finish their jobs"""
+        if self.closed:
+            return
+
+        m = self.metrics()
+        logger.info("Closing worker pool of %s workers: stages: %s jobs: %s "
+                    "busy: %.1fs uptime: %.1fs utilization: %.0f%% "
+                    "restarts: %s", m["workers"], m["stages"], m["jobs"],
+                    m["busySeconds"], m["uptimeSeconds"],
+                    100 * m["utilization"], m["restarts"])
+        self._pool.close()
+        self._pool.join()
+        self._pool = None
+
+    def terminate(self):
+        """Shuts the pool down immediately"""
+        if self.closed:
+            return
+
+        self._pool.terminate()
+        self._pool.join()
+        self._pool = None
+
+
+def _utilization(busySeconds: float, seconds: float, processes: int) -> float:
+    return busySeconds / (seconds * processes) if seconds > 0 else 0.0
+
+
+@contextmanager
+def sharedWorkerPool(processes: int=None,
+                     preload: Iterable[str]=DEFAULT_PRELOAD_MODULES):
+    """Context in which `reportingImapUnordered` runs jobs on one warm
+    `WorkerPool` rather than a pool per call"""
+    global _sharedPool
+    if _sharedPool is not None:
+        raise RuntimeError("A shared worker pool is already active")
+
+    with WorkerPool(processes, preload) as pool:
+        _sharedPool = pool
+        try:
+            yield pool
+        finally:
+            _sharedPool = None
+
+
 def reportingImapUnordered(func,
                            jobArgs: Iterable[tuple],
-                           reportFrequency: int=100):
+                           reportFrequency: int=100,
+                           initializer=None,
+                           initargs: tuple=(),
+                           chunksize: int=1,
+                           maxTasksPerChild: int=None,
+                           maxInFlight: int=None):
     """Executes a function on a batch of inputs using multiprocessing in an
     unordered fashion (`multiprocessing.Pool.imap_unordered`). Reports progress
-    periodically as jobs complete
+    periodically as jobs complete. Jobs run on the shared pool if one is
+    active (see `sharedWorkerPool`), otherwise on a pool closed once the
+    results are consumed.
 
     :param func: function to execute
     :param jobArgs: iterable of tuples where each tuple is the arguments to
     `func` for a single job
     :param reportFrequency: After a batch of jobs having this size completes,
     log simple status report
+    :param initializer: function run once by each worker process on start
+    :param initargs: arguments to `initializer`
+    :param chunksize: number of jobs sent to a worker in a single message
+    :param maxTasksPerChild: number of tasks after which a worker is replaced
+    by a fresh process; None for no limit. Differing from the shared pool's,
+    jobs run on a pool of their own.
+    :param maxInFlight: maximum number of jobs drawn from `jobArgs` whose
+    results have not yet been consumed; None for no limit. Must be at least
+    `chunksize`.
     :return list of job results
     """
-    p = Pool(processes=cpu_count())
-    i = -1
-    for i, result in enumerate(p.imap_unordered(func, jobArgs), 1):
-        yield result
-        if i % reportFrequency == 0:
-            logger.info("multiprocessing completed: %s", i)
+    limiter = None
+    if maxInFlight:
+        if maxInFlight < chunksize:
+            raise ValueError("maxInFlight: %s must be at least chunksize: %s"
+                             % (maxInFlight, chunksize))
+
+        limiter = InFlightLimiter(maxInFlight)
+        jobArgs = limiter.gate(jobArgs)
+
+    if (_sharedPool is not None and
+            _sharedPool.maxTasksPerChild == maxTasksPerChild):
+        pool = _sharedPool
+        consumed = False
+        try:
+            yield from pool.imapUnordered(func, jobArgs, reportFrequency,
+                                          initializer, initargs, chunksize,
+                                          limiter)
+            consumed = True
+        finally:
+            if not consumed and not pool.closed:
+                # drop the jobs of abandoned results rather than letting
+                # them delay later stages and the pool's close
+                logger.info("Restarting shared worker pool to drop "
+                            "abandoned jobs")
+                pool.restart()
+        return
+
+    with WorkerPool(preload=(), maxTasksPerChild=maxTasksPerChild) as pool:
+        yield from pool.imapUnordered(func, jobArgs, reportFrequency,
+                                      initializer, initargs, chunksize,
+                                      limiter)
+
+
+def _supervisedWorker(conn, func, initializer, initargs: tuple):
+    """Loop of a `supervisedImapUnordered` worker process: runs jobs received
+    on its connection until sent None"""
+    if initializer is not None:
+        initializer(*initargs)
+
+    while True:
+        args = conn.recv()
+        if args is None:
+            break
+
+        try:
+            conn.send((True, func(args)))
+        except BaseException as e:
+            try:
+                conn.send((False, e))
+            except BaseException:
+                # exception not picklable
+                conn.send((False, RuntimeError(repr(e))))
+
+
+class _SupervisedWorker:
+    """Parent-side handle of a `supervisedImapUnordered` worker process"""
+    def __init__(self, func, initializer, initargs: tuple):
+        self.conn, childConn = Pipe()
+        self.process = Process(target=_supervisedWorker,
+                               args=(childConn, func, initializer, initargs),
+                               daemon=True)
+        self.process.start()
+        childConn.close()
+        self.args = None
+        self.deadline = None
+        self.tasks = 0
+
+    def submit(self, args: tuple, timeout: float):
+        self.args = args
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.conn.send(args)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+
+        self.process.join()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def supervisedImapUnordered(func,
+                            jobArgs: Iterable[tuple],
+                            timeout: float=None,
+                            onTimeout: Callable[[tuple, float], object]=None,
+                            onCrash: Callable[[tuple, int], object]=None,
+                            maxTasksPerChild: int=None,
+                            reportFrequency: int=100,
+                            initializer=None,
+                            initargs: tuple=()):
+    """Variant of `reportingImapUnordered` bounding the wall-clock time of each
+    job. A worker exceeding `timeout` seconds on a job is killed and replaced,
+    so a single pathological input cannot stall the tail of the run. Jobs are
+    sent to workers one at a time.
+
+    :param func: function to execute
+    :param jobArgs: iterable of tuples where each tuple is the arguments to
+    `func` for a single job
+    :param timeout: seconds allowed per job, None for no limit
+    :param onTimeout: called with the arguments and elapsed seconds of each
+    job whose worker was killed; its return value, if not None, is yielded in
+    place of the job's result
+    :param onCrash: called with the arguments of a job whose worker process
+    died and the process' exit code; the worker is replaced and the return
+    value, if not None, is yielded in place of the job's result. If None, a
+    worker death raises a RuntimeError.
+    :param maxTasksPerChild: number of jobs after which a worker is replaced by
+    a fresh process, bounding memory growth; None for no limit
+    :param reportFrequency: After a batch of jobs having this size completes,
+    log simple status report
+    :param initializer: function run once by each worker process on start
+    :param initargs: arguments to `initializer`
+    :return generator of job results
+    """
+    def _newWorker():
+        return _SupervisedWorker(func, initializer, initargs)
+
+    jobs = iter(jobArgs)
+    idle = [_newWorker() for _ in range(cpu_count())]
+    busy = dict()
+    completed = 0
+    timeouts = 0
+    recycled = 0
+    try:
+        while True:
+            while idle and jobs is not None:
+                args = next(jobs, None)
+                if args is None:
+                    jobs = None
+                    break
+
+                w = idle.pop()
+                w.submit(args, timeout)
+                busy[w.conn] = w
+
+            if not busy:
+                break
+
+            deadlines = [w.deadline for w in busy.values() if w.deadline]
+            waitSeconds = (max(0.0, min(deadlines) - time.monotonic())
+                           if deadlines else None)
+            ready = wait(list(busy), timeout=waitSeconds)
+            for conn in ready:
+                w = busy.pop(conn)
+                try:
+                    ok, result = conn.recv()
+                except EOFError:
+                    w.kill()
+                    if onCrash is None:
+                        raise RuntimeError("Worker process %s died with exit "
+                                           "code %s" % (w.process.pid,
+                                                        w.process.exitcode))
 
-    logger.info("multiprocessing: total completed: %s", i)
+                    logger.warning("Worker died with exit code %s on job: %s",
+                                   w.process.exitcode, w.args[0])
+                    idle.append(_newWorker())
+                    result = onCrash(w.args, w.process.exitcode)
+                    if result is not None:
+                        yield result
 
+                    continue
 
-def feetsExtract(args) -> (str, str, list, list):
+                if not ok:
+                    raise result
+
+                w.tasks += 1
+                if maxTasksPerChild and w.tasks >= maxTasksPerChild:
+                    w.stop()
+                    w = _newWorker()
+                    recycled += 1
+
+                idle.append(w)
+                completed += 1
+                yield result
+                if completed % reportFrequency == 0:
+                    logger.info("multiprocessing completed: %s", completed)
+
+            now = time.monotonic()
+            for conn, w in list(busy.items()):
+                if w.deadline and now >= w.deadline and conn not in ready:
+                    busy.pop(conn)
+                    w.kill()
+                    timeouts += 1
+                    elapsed = timeout + now - w.deadline
+                    logger.warning("Killed worker after %.1fs on job: %s",
+                                   elapsed, w.args[0])
+                    idle.append(_newWorker())
+                    result = None if onTimeout is None else onTimeout(w.args,
+                                                                      elapsed)
+                    if result is not None:
+                        yield result
+    finally:
+        for w in idle:
+            w.stop()
+        for w in busy.values():
+            w.kill()
+
+    logger.info("multiprocessing: total completed: %s timed out: %s "
+                "recycled workers: %s", completed, timeouts, recycled)
+
+
+def initFeetsWorker(data: List[str], excludedFeatures: List[str],
+                    nativeExtractors: dict=None, lcBudget: float=None,
+                    bands: List[str]=None):
+    """Pool initializer building the worker's `feets.FeatureSpace` once so it
+    need not be pickled with every job.
+
+    :param data: feets input data types
+    :param excludedFeatures: feets features to exclude
+    :param nativeExtractors: optional params of native extractors by name, see
+    `lcml.features.native`
+    :param lcBudget: optional time budget in seconds for the extraction of
+    each LC, see `lcml.features.native.NativeFeatureSpace.extractBudgeted`
+    :param bands: optional names of two bands; if given the worker extracts
+    combined vectors of objects with `feetsExtractMultiBand`
+    """
+    global _featureSpace, _featureData, _nativeExtractors, _lcBudget
+    if bands:
+        _featureSpace = MultiBandFeatureSpace(
+            data, bands, exclude=excludedFeatures,
+            nativeExtractors=nativeExtractors)
+    else:
+        _featureSpace = featureSpace(data, exclude=excludedFeatures,
+                                     nativeExtractors=nativeExtractors,
+                                     budgeted=lcBudget is not None)
+    _featureData = data
+    _nativeExtractors = nativeExtractors
+    _lcBudget = lcBudget
+    # spaces of a previous initialization, e.g., by an earlier stage of a
+    # warm pool's worker, may differ in native extractors
+    _subsetFeatureSpaces.clear()
+
+
+def feetsExtract(args) -> Union[tuple, ExtractionFailure]:
     """Wrapper function conforming to Python multiprocessing API performing the
-    `feets` library's feature extraction.
+    `feets` library's feature extraction. Requires the worker to have been
+    initialized with `initFeetsWorker`.
     """
     return _feetsExtract(*args)
 
 
-def _feetsExtract(featureSpace, uid, label, times, mags, errors):
+def _feetsExtract(uid, label, times, mags, errors, precomputed=None):
     """
-    :param featureSpace: feets.FeatureSpace object
     :param uid: light curve uid
     :param label: class label
     :param times: lc times
     :param mags: lc mags
     :param errors: lc errors
-    :return: lc uid, lc class label, feature names, feature values
+    :param precomputed: optional feature values computed by the batched
+    native extractors, see `lcml.features.native`
+    :return: lc uid, lc class label, feature names, feature values and, if the
+    worker has an LC budget, the mask of features skipped for lack of time;
+    or an `ExtractionFailure` if extraction raised
     """
     try:
-        ftNames, features = featureSpace.extract(times, mags, errors)
-    except BaseException:
+        if _lcBudget is not None:
+            return (uid, label) + _featureSpace.extractBudgeted(
+                times, mags, errors, _lcBudget, precomputed=precomputed)
+        elif precomputed is None:
+            ftNames, features = _featureSpace.extract(times, mags, errors)
+        else:
+            ftNames, features = _featureSpace.extract(
+                times, mags, errors, precomputed=precomputed)
+    except Exception:
         logger.exception("Feets bombed for LC uid: %s", uid)
-        raise
+        return extractionFailure(uid, label)
 
     return uid, label, ftNames, features
+
+
+def feetsExtractPacked(ids: List[str], labels: List[str], times: np.ndarray,
+                       mags: np.ndarray, errors: np.ndarray,
+                       offsets: np.ndarray) -> list:
+    """Performs feature extraction for a page of packed LCs. Batched native
+    extractors, if any, run once for the whole page. Requires the worker to
+    have been initialized with `initFeetsWorker`.
+
+    :param ids: LC uids
+    :param labels: LC class labels
+    :param times: packed times
+    :param mags: packed mags
+    :param errors: packed errors
+    :param offsets: offsets of the packed LCs
+    :return: list of `feetsExtract` results
+    """
+    precomputed = [None] * len(ids)
+    if getattr(_featureSpace, "batched", False):
+        try:
+            precomputed = _featureSpace.extractPacked(times, mags, errors,
+                                                      offsets)
+        except Exception:
+            # extractors then run for each LC, isolating failures
+            logger.exception("Batched extraction failed for page of: %s",
+                             ids[0])
+
+    results = []
+    for i, uid in enumerate(ids):
+        lc = slice(offsets[i], offsets[i + 1])
+        results.append(_feetsExtract(uid, labels[i], times[lc], mags[lc],
+                                     errors[lc], precomputed[i]))
+
+    return results
+
+
+def feetsExtractMultiBand(args) -> Union[tuple, ExtractionFailure]:
+    """Performs feature extraction of an object observed in two bands.
+    Requires the worker to have been initialized with `initFeetsWorker` given
+    the bands.
+
+    :param args: tuple of object id, label, (times, mags, errors) of each band
+    and the standardization statistics of each band's LC or None
+    :return: object id, class label, feature names, combined feature values;
+    or an `ExtractionFailure` if extraction raised
+    """
+    uid, label, lcs, lcStats = args
+    try:
+        ftNames, features = _featureSpace.extract(lcs, lcStats)
+    except Exception:
+        logger.exception("Feets bombed for object uid: %s", uid)
+        return extractionFailure(uid, label)
+
+    return uid, label, ftNames, features
+
+
+def feetsExtractSubset(args) -> Union[tuple, ExtractionFailure]:
+    """Performs `feets` feature extraction of only a subset of features. The
+    worker builds a FeatureSpace for each distinct subset once. Requires the
+    worker to have been initialized with `initFeetsWorker`.
+
+    :param args: tuple of uid, label, times, mags, errors, features (tuple of
+    feature names) and an opaque value returned unchanged
+    :return: lc uid, lc class label, feature names, feature values, opaque
+    value; or an `ExtractionFailure` if extraction raised
+    """
+    uid, label, times, mags, errors, features, passThrough = args
+    fs = _subsetFeatureSpaces.get(features)
+    if fs is None:
+        fs = featureSpace(_featureData, only=features,
+                          nativeExtractors=_nativeExtractors)
+        _subsetFeatureSpaces[features] = fs
+
+    try:
+        ftNames, values = fs.extract(times, mags, errors)
+    except Exception:
+        logger.exception("Feets bombed for LC uid: %s", uid)
+        return extractionFailure(uid, label)
+
+    return uid, label, ftNames, values, passThrough
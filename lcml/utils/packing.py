@@ -0,0 +1,76 @@
+"""Utilities for 'packed' batches of variable-length arrays. A packed batch is a
+single contiguous values array holding the concatenation of several arrays
+together with an offsets array of length `n + 1` such that array `i` occupies
+`values[offsets[i]:offsets[i + 1]]`."""
+from typing import List, Sequence
+
+import numpy as np
+
+
+def packArrays(arrays: Sequence[np.ndarray],
+               dtype=np.float64) -> (np.ndarray, np.ndarray):
+    """Concatenates arrays into a single packed values array.
+
+    :param arrays: sequence of 1-d arrays
+    :param dtype: dtype of packed values
+    :return: packed values and offsets (int64) of length `len(arrays) + 1`
+    """
+    offsets = packOffsets(arrays)
+    values = np.empty(offsets[-1], dtype=dtype)
+    for i, a in enumerate(arrays):
+        values[offsets[i]:offsets[i + 1]] = a
+
+    return values, offsets
+
+
+def packOffsets(arrays: Sequence[np.ndarray]) -> np.ndarray:
+    """Offsets (int64) of length `len(arrays) + 1` of arrays in a packed
+    batch"""
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(a) for a in arrays], out=offsets[1:])
+    return offsets
+
+
+def unpackArrays(values: np.ndarray, offsets: np.ndarray) -> List[np.ndarray]:
+    """Returns views of the individual arrays in a packed batch"""
+    return [values[offsets[i]:offsets[i + 1]]
+            for i in range(len(offsets) - 1)]
+
+
+def segmentLengths(offsets: np.ndarray) -> np.ndarray:
+    """Lengths of each array in a packed batch"""
+    return np.diff(offsets)
+
+
+def segmentIds(offsets: np.ndarray) -> np.ndarray:
+    """For each element of the packed values, the index of the array it belongs
+    to. Useful for broadcasting per-array values back over the packed batch."""
+    return np.repeat(np.arange(len(offsets) - 1), segmentLengths(offsets))
+
+
+def segmentSums(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Sum of each array in a packed batch. Empty arrays sum to 0."""
+    lengths = segmentLengths(offsets)
+    sums = np.zeros(len(lengths), dtype=np.float64)
+    nonEmpty = lengths > 0
+    if nonEmpty.any():
+        sums[nonEmpty] = np.add.reduceat(values, offsets[:-1][nonEmpty])
+
+    return sums
+
+
+def segmentSorted(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Packed batch with each array's values sorted in ascending order"""
+    return values[np.lexsort((values, segmentIds(offsets)))]
+
+
+def segmentTake(values: np.ndarray, offsets: np.ndarray,
+                index: np.ndarray) -> np.ndarray:
+    """Takes the `index[i]`-th value of each array `i` of a packed batch.
+    Yields NaN where the index is outside its array."""
+    lengths = segmentLengths(offsets)
+    index = np.asarray(index)
+    valid = (index >= 0) & (index < lengths)
+    taken = np.full(len(lengths), np.nan)
+    taken[valid] = values[offsets[:-1][valid] + index[valid]]
+    return taken
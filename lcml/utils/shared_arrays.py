@@ -0,0 +1,156 @@
+"""Transport of packed float64 arrays between processes through
+`multiprocessing.shared_memory` segments. The parent writes a page of packed
+arrays into a segment and sends workers only the segment name and offsets;
+workers build zero-copy NumPy views of the segment."""
+import logging
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import threading
+from typing import List, Sequence, Union
+
+import numpy as np
+
+from lcml.utils.packing import packOffsets
+
+
+logger = logging.getLogger(__name__)
+
+
+#: Segments are allocated in multiples of this many bytes to improve reuse
+_ALLOCATION_QUANTUM = 1 << 20
+
+
+#: Worker process' attached segments by name. Segments are recycled by the
+#: parent so attachments stay valid for the life of the segment pool.
+_attached = dict()
+
+#: Bound on a worker's cached attachments; segments replaced by the parent
+#: would otherwise stay mapped in the worker
+_MAX_ATTACHED = 64
+
+
+class SharedSegmentPool:
+    """Parent-side free-list of shared memory segments. At most `maxSegments`
+    exist at once; `acquire` blocks until one is released, which bounds both
+    memory use and the number of pages in flight.
+
+    Must be created before the worker processes so that they share the
+    parent's resource tracker. Otherwise each worker starts its own tracker,
+    which unlinks attached segments as 'leaked' when the worker exits."""
+    def __init__(self, maxSegments: int):
+        resource_tracker.ensure_running()
+        self.maxSegments = maxSegments
+        self._segments = dict()
+        self._free = list()  # type: List[SharedMemory]
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def acquire(self, nbytes: int) -> Union[SharedMemory, None]:
+        """Returns a segment of at least `nbytes`, reusing the smallest
+        sufficient free segment, or None if the pool has been closed"""
+        with self._cond:
+            while not self._closed:
+                fits = [s for s in self._free if s.size >= nbytes]
+                if fits:
+                    seg = min(fits, key=lambda x: x.size)
+                    self._free.remove(seg)
+                    return seg
+
+                if len(self._segments) >= self.maxSegments and self._free:
+                    # free segments are all too small; replace one
+                    self._destroy(self._free.pop())
+
+                if len(self._segments) < self.maxSegments:
+                    size = -(-max(nbytes, 1) // _ALLOCATION_QUANTUM)
+                    seg = SharedMemory(create=True,
+                                       size=size * _ALLOCATION_QUANTUM)
+                    self._segments[seg.name] = seg
+                    return seg
+
+                self._cond.wait()
+
+            return None
+
+    def release(self, name: str):
+        """Returns a segment to the free-list once its consumer is done"""
+        with self._cond:
+            seg = self._segments.get(name)
+            if seg is not None:
+                self._free.append(seg)
+                self._cond.notify()
+
+    def close(self):
+        """Unlinks all segments and wakes any blocked `acquire`"""
+        with self._cond:
+            self._closed = True
+            for seg in list(self._segments.values()):
+                self._destroy(seg)
+
+            self._free = list()
+            self._cond.notify_all()
+
+    def _destroy(self, seg: SharedMemory):
+        self._segments.pop(seg.name, None)
+        seg.close()
+        seg.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def writePacked(pool: SharedSegmentPool,
+                columns: Sequence[Sequence[np.ndarray]]) -> Union[tuple, None]:
+    """Packs several equally shaped columns of arrays, e.g., the times, mags
+    and errors of a page of LCs, into a single shared segment.
+
+    :param pool: segment pool
+    :param columns: sequence of columns, each a sequence of arrays where the
+    i-th array of every column has the same length
+    :return: segment name and packed offsets, or None if the pool is closed
+    """
+    offsets = packOffsets(columns[0])
+    total = int(offsets[-1])
+    seg = pool.acquire(8 * total * len(columns))
+    if seg is None:
+        return None
+
+    view = np.ndarray((len(columns), total), dtype=np.float64, buffer=seg.buf)
+    for c, col in enumerate(columns):
+        for i, a in enumerate(col):
+            view[c, offsets[i]:offsets[i + 1]] = a
+
+    del view
+    return seg.name, offsets
+
+
+def attachPacked(name: str, columnCount: int,
+                 offsets: np.ndarray) -> List[List[np.ndarray]]:
+    """Worker-side zero-copy views of the columns written by `writePacked`.
+    Views are only valid until the parent recycles the segment."""
+    view = attachPackedColumns(name, columnCount, offsets)
+    return [[view[c, offsets[i]:offsets[i + 1]]
+             for i in range(len(offsets) - 1)]
+            for c in range(columnCount)]
+
+
+def attachPackedColumns(name: str, columnCount: int,
+                        offsets: np.ndarray) -> np.ndarray:
+    """Like `attachPacked` but returns a single view of shape
+    (columnCount, total length) whose rows are the packed columns"""
+    seg = _attached.get(name)
+    if seg is None:
+        if len(_attached) >= _MAX_ATTACHED:
+            # a worker handles one job at a time so no other view is alive
+            for old in _attached.values():
+                old.close()
+
+            _attached.clear()
+
+        seg = SharedMemory(name=name)
+        _attached[name] = seg
+
+    total = int(offsets[-1])
+    return np.ndarray((columnCount, total), dtype=np.float64, buffer=seg.buf)
@@ -0,0 +1,157 @@
+"""Mergeable per-feature statistics accumulated over batches of feature
+vectors in a single pass. Accumulators of disjoint batches, e.g., computed by
+different workers, are combined with `merge` into those of the union, using
+Chan et al.'s pairwise update of Welford's mean and sum of squared deviations.
+Quantiles are estimated from a uniform reservoir sample of vectors, kept as
+the vectors with the smallest random keys, which is likewise mergeable."""
+from typing import Union
+
+import numpy as np
+
+
+#: Default number of vectors kept by the reservoir sample
+DEFAULT_RESERVOIR_SIZE = 1000
+
+
+def combineMoments(countA, meanA, m2A, countB, meanB,
+                   m2B) -> (np.ndarray, np.ndarray, np.ndarray):
+    """Count, mean and sum of squared deviations of the union of two groups of
+    values, elementwise over features. Empty groups contribute nothing."""
+    count = countA + countB
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weightB = np.where(count > 0, countB / count, 0.0)
+        delta = meanB - meanA
+        mean = np.where(countB > 0, meanA + delta * weightB, meanA)
+        mean = np.where(countA > 0, mean, meanB)
+        m2 = m2A + m2B + np.where(countA * countB > 0,
+                                  delta ** 2 * countA * weightB, 0.0)
+
+    return count, mean, m2
+
+
+class FeatureStats:
+    """Streaming statistics of each feature: number of vectors, non-finite
+    value counts, and mean, sum of squared deviations, minimum and maximum of
+    the finite values. The vector length is fixed by the first update.
+
+    :param reservoirSize: number of vectors kept for quantile estimates
+    """
+    def __init__(self, reservoirSize: int=DEFAULT_RESERVOIR_SIZE):
+        self.reservoirSize = reservoirSize
+        self.count = 0
+        self.finiteCounts = None
+        self.means = None
+        self.m2s = None
+        self.mins = None
+        self.maxs = None
+        self.reservoir = None
+        self.reservoirKeys = None
+
+    @classmethod
+    def of(cls, vectors: Union[np.ndarray, list],
+           reservoirSize: int=DEFAULT_RESERVOIR_SIZE) -> "FeatureStats":
+        stats = cls(reservoirSize)
+        stats.update(vectors)
+        return stats
+
+    @property
+    def nonFiniteCounts(self) -> np.ndarray:
+        return self.count - self.finiteCounts
+
+    @property
+    def variances(self) -> np.ndarray:
+        """Population variances of the finite values"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.finiteCounts > 0,
+                            self.m2s / self.finiteCounts, np.nan)
+
+    def update(self, vectors: Union[np.ndarray, list]):
+        """Adds a batch of feature vectors"""
+        x = np.asarray(vectors, dtype=np.float64)
+        if not x.size:
+            return
+
+        x = np.atleast_2d(x)
+        finite = np.isfinite(x)
+        counts = finite.sum(axis=0)
+        values = np.where(finite, x, 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = np.where(counts > 0, values.sum(axis=0) / counts, 0.0)
+        m2s = np.where(finite, x - means, 0.0)
+        m2s = np.sum(m2s ** 2, axis=0)
+        batch = FeatureStats(self.reservoirSize)
+        batch.count = len(x)
+        batch.finiteCounts = counts
+        batch.means = means
+        batch.m2s = m2s
+        batch.mins = np.where(finite, x, np.inf).min(axis=0)
+        batch.maxs = np.where(finite, x, -np.inf).max(axis=0)
+        batch.reservoirKeys = np.random.RandomState().random_sample(len(x))
+        batch.reservoir = x
+        batch._trimReservoir()
+        self.merge(batch)
+
+    def merge(self, other: "FeatureStats"):
+        """Adds the statistics of a disjoint set of vectors"""
+        if not other.count:
+            return
+
+        if not self.count:
+            for k, v in vars(other).items():
+                if k != "reservoirSize":
+                    setattr(self, k, v)
+            self._trimReservoir()
+            return
+
+        if len(other.means) != len(self.means):
+            raise ValueError("Cannot merge statistics of vector lengths: %s "
+                             "and %s" % (len(self.means), len(other.means)))
+
+        self.finiteCounts, self.means, self.m2s = combineMoments(
+            self.finiteCounts, self.means, self.m2s, other.finiteCounts,
+            other.means, other.m2s)
+        self.count += other.count
+        self.mins = np.minimum(self.mins, other.mins)
+        self.maxs = np.maximum(self.maxs, other.maxs)
+        self.reservoir = np.concatenate((self.reservoir, other.reservoir))
+        self.reservoirKeys = np.concatenate((self.reservoirKeys,
+                                             other.reservoirKeys))
+        self._trimReservoir()
+
+    def select(self, indices) -> "FeatureStats":
+        """Statistics of a subset of the features, by their positions"""
+        selected = FeatureStats(self.reservoirSize)
+        selected.count = self.count
+        if self.count:
+            for k in ("finiteCounts", "means", "m2s", "mins", "maxs"):
+                setattr(selected, k, getattr(self, k)[indices])
+            selected.reservoir = self.reservoir[:, indices]
+            selected.reservoirKeys = self.reservoirKeys
+
+        return selected
+
+    def _trimReservoir(self):
+        if len(self.reservoirKeys) > self.reservoirSize:
+            keep = np.argsort(self.reservoirKeys)[:self.reservoirSize]
+            self.reservoir = self.reservoir[keep]
+            self.reservoirKeys = self.reservoirKeys[keep]
+
+    def quantiles(self, q: float) -> np.ndarray:
+        """Estimates of each feature's q-th quantile of its finite values
+        from the reservoir sample; NaN for features without any"""
+        sample = np.where(np.isfinite(self.reservoir), self.reservoir, np.nan)
+        result = np.full(sample.shape[1], np.nan)
+        observed = np.isfinite(sample).any(axis=0)
+        result[observed] = np.nanquantile(sample[:, observed], q, axis=0)
+        return result
+
+    def toDict(self) -> dict:
+        """Plain representation for persistence"""
+        return dict(vars(self))
+
+    @classmethod
+    def fromDict(cls, d: dict) -> "FeatureStats":
+        stats = cls(d["reservoirSize"])
+        for k, v in d.items():
+            setattr(stats, k, v)
+        return stats
@@ -26,6 +26,7 @@ if __name__ == "__main__":
     setup(name="lcml",
           version=getVersion(),
           install_requires=getRequirements(),
+          extras_require={"dask": ["dask[distributed]"]},
           packages=find_packages(),
           description="Light curve classification prototyping",
           license="MIT License",
@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from lcml.pipeline.database.serialization import serArray
+from lcml.pipeline.database.sqlite_db import (INSERT_REPLACE_INTO_FEATURES,
+                                              FeatureSchemaEntry,
+                                              connFromParams, ensureDbTables,
+                                              selectFeaturesLabelsMasks,
+                                              writeFeatureSchema)
+from lcml.utils.context_util import joinRoot, loadJson
+
+
+class SelectFeaturesLabelsMasksTest(unittest.TestCase):
+    """Loading a features table holding rows of two params fingerprints,
+    only the rows of the latest schema's fingerprint are selected"""
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        conf = loadJson(joinRoot("conf", "common", "pipeline.json"))
+        self.dbParams = conf["database"]
+        self.dbParams["dbPath"] = os.path.join(self.tmpDir, "test.db")
+        ensureDbTables(self.dbParams)
+        self.table = self.dbParams["feature_table"]
+
+        conn = connFromParams(self.dbParams)
+        cursor = conn.cursor()
+        schemaTable = self.dbParams["feature_schema_table"]
+        writeFeatureSchema(cursor, schemaTable, self.table,
+                           self._entries(["a", "b", "c"]), "old")
+        writeFeatureSchema(cursor, schemaTable, self.table,
+                           self._entries(["c", "x", "a", "b"]), "new")
+        insertQry = INSERT_REPLACE_INTO_FEATURES % self.table
+        cursor.executemany(insertQry, [
+            ("lc0", "A", serArray(np.array([1., 2., 3.])), "old", None),
+            ("lc1", "B", serArray(np.array([13., 19., 11., 12.])), "new",
+             None),
+            ("lc2", "A", serArray(np.array([23., 29., 21., 22.])), "new",
+             None)])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    @staticmethod
+    def _entries(features):
+        return [FeatureSchemaEntry(f, "feets", "0.4", "{}") for f in features]
+
+    def _insert(self, row):
+        conn = connFromParams(self.dbParams)
+        conn.execute(INSERT_REPLACE_INTO_FEATURES % self.table, row)
+        conn.commit()
+        conn.close()
+
+    def testSkipsRowsOfOtherFingerprint(self):
+        features, labels, _ = selectFeaturesLabelsMasks(self.dbParams,
+                                                        self.table)
+        self.assertEqual(sorted(labels), ["A", "B"])
+        self.assertTrue(all(len(f) == 4 for f in features))
+
+    def testProjectsSubsetByLatestSchema(self):
+        features, labels, _ = selectFeaturesLabelsMasks(
+            self.dbParams, self.table, features=["a", "b", "c"])
+        byLabel = dict(zip(labels, features))
+        np.testing.assert_array_equal(byLabel["B"], [11., 12., 13.])
+        np.testing.assert_array_equal(byLabel["A"], [21., 22., 23.])
+
+    def testRaisesOnLengthMismatch(self):
+        self._insert(("lc3", "B", serArray(np.array([1., 2., 3.])), "new",
+                      None))
+        with self.assertRaises(ValueError):
+            selectFeaturesLabelsMasks(self.dbParams, self.table,
+                                      features=["a"])
+
+
+if __name__ == "__main__":
+    unittest.main()